@@ -0,0 +1,112 @@
+import threading
+import time
+import uuid as uuid_pkg
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple
+
+from config import settings
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries also expire after ttl_seconds.
+
+    Cached values are shared between callers and must not be mutated.
+    A value loaded while an invalidation happened is returned but not
+    stored, so a slow reader cannot put back data that a concurrent write
+    has just invalidated.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value of key, calling loader() on a miss."""
+        if not self.enabled:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def peek(self, key: Hashable) -> Any:
+        """Return the cached value of key, or None, without loading it."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            return None
+
+    def invalidate(self, keys: Iterable[Hashable]):
+        """Drop the given keys."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+
+# identifies this replica in cache invalidation notifications
+INSTANCE_ID = uuid_pkg.uuid4().hex
+
+# GET /usecases and GET /usecases/{use_case}
+use_case_cache = TTLCache(settings.USECASE_CACHE_SIZE, settings.USECASE_CACHE_TTL_SECONDS)
+
+USE_CASE_LISTING_KEY = ("use_cases",)
+
+
+def use_case_key(use_case: str) -> Tuple[str, str]:
+    return ("use_case", use_case)
+
+
+def invalidate_use_cases(use_cases: Iterable[str]):
+    """Drop the cached reads affected by a write to the given use-cases."""
+    use_case_cache.invalidate([USE_CASE_LISTING_KEY, *(use_case_key(use_case) for use_case in use_cases)])
@@ -0,0 +1,125 @@
+import json
+import logging
+import select
+import threading
+import time
+from typing import Optional
+
+import database
+from cache import INSTANCE_ID, invalidate_use_cases, use_case_cache
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# how often the listen loop wakes up to check for shutdown
+POLL_INTERVAL_SECONDS = 1.0
+
+
+class CacheInvalidationListener:
+    """
+    Keeps the in-process caches coherent across replicas.
+
+    Write paths send a NOTIFY on settings.CACHE_NOTIFY_CHANNEL naming the
+    use-cases they changed (see utils.notify_use_cases_changed). A background
+    thread LISTENs on a dedicated connection and evicts the matching entries.
+    Notifications are lost while the connection is down, so the caches are
+    flushed whenever it drops and again once LISTEN is re-established.
+    """
+
+    def __init__(
+        self,
+        channel: str = settings.CACHE_NOTIFY_CHANNEL,
+        reconnect_seconds: float = settings.CACHE_SYNC_RECONNECT_SECONDS,
+        heartbeat_seconds: float = settings.CACHE_SYNC_HEARTBEAT_SECONDS,
+        engine=None,
+    ):
+        self._channel = channel
+        self._reconnect_seconds = reconnect_seconds
+        self._heartbeat_seconds = heartbeat_seconds
+        self._engine = engine
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.connected = False
+        self.received = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start listening, on PostgreSQL only."""
+        if self.running or (self._engine or database.engine).dialect.name != "postgresql":
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-listener", daemon=True)
+        self._thread.start()
+        logger.info(f"Cache invalidation listener started on channel {self._channel}")
+
+    def stop(self, timeout: Optional[float] = 5):
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        logger.info("Cache invalidation listener stopped")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener disconnected: {e}")
+            if self._stopping.is_set():
+                break
+            # notifications sent while disconnected are lost
+            use_case_cache.clear()
+            self._stopping.wait(self._reconnect_seconds)
+
+    def _listen(self):
+        raw = (self._engine or database.engine).raw_connection()
+        # a dedicated connection: it is never handed back to the pool
+        raw.detach()
+        connection = raw.dbapi_connection
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self._channel}"')
+            # writes committed before LISTEN took effect were not notified
+            use_case_cache.clear()
+            self.connected = True
+
+            last_activity = time.monotonic()
+            while not self._stopping.is_set():
+                readable, _, _ = select.select([connection], [], [], POLL_INTERVAL_SECONDS)
+                if readable:
+                    connection.poll()
+                    last_activity = time.monotonic()
+                elif time.monotonic() - last_activity >= self._heartbeat_seconds:
+                    # surfaces connections that died without closing the socket
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    last_activity = time.monotonic()
+
+                while connection.notifies:
+                    self._handle(connection.notifies.pop(0).payload)
+        finally:
+            self.connected = False
+            # closed directly: a pool reset would fail on a dead connection
+            connection.close()
+
+    def _handle(self, payload: str):
+        self.received += 1
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Unreadable cache notification, flushing: {payload!r}")
+            use_case_cache.clear()
+            return
+
+        # the replica that made the write has already evicted its own entries
+        if message.get("origin") == INSTANCE_ID:
+            return
+        if message.get("use_cases") is None:
+            use_case_cache.clear()
+        else:
+            invalidate_use_cases(message["use_cases"])
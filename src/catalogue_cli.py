@@ -0,0 +1,435 @@
+"""
+Command-line maintenance tools for the data catalogue.
+
+Usage:
+    python catalogue_cli.py load datasets.jsonl
+    python catalogue_cli.py load datasets.csv.gz --format csv
+    python catalogue_cli.py export catalogue.ndjson.zst
+    python catalogue_cli.py restore catalogue.ndjson.zst
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import sys
+import uuid as uuid_pkg
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import delete, func, null, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+
+import database
+from models import NodeDatasetInfo, UseCase, UseCaseDataset, UseCaseVersion, SyntheticDatasetGenerationRequestStatusTable as SDGRT
+from utils import compute_content_hash, mark_use_cases_changed, rebuild_use_case_membership, validate_dataset_info
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for .zst files
+    zstandard = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TABLE = NodeDatasetInfo.__tablename__
+STAGING_TABLE = "catalogue_staging"
+
+# Columns filled through COPY, in the order they are written to the stream
+COPY_COLUMNS = [
+    "id", "node", "path", "use_case", "timestamp",
+    "num_records", "num_features", "dataset_metadata", "content_hash",
+]
+# Columns refreshed when a loaded (node, path) is already catalogued;
+# deleted_at is not loaded, so a deleted dataset loaded again is revived
+UPDATE_COLUMNS = [
+    "use_case", "timestamp", "num_records", "num_features", "dataset_metadata", "content_hash", "deleted_at",
+]
+COPY_NULL = "\\N"
+
+
+# Tables included in exports, in restore order. Use-case versions are
+# included so that a restored use-case never reuses an ETag clients hold.
+# Left out: catalogue_stats and catalogue_facets, derived from the datasets
+# and rebuilt by restore, and jobs, which only make sense on the instance
+# that queued them.
+EXPORT_TABLES = [
+    NodeDatasetInfo.__table__,
+    UseCase.__table__,
+    UseCaseDataset.__table__,
+    UseCaseVersion.__table__,
+    SDGRT.__table__,
+]
+EXPORT_FORMAT = "data-catalogue-export"
+EXPORT_VERSION = 1
+
+
+def guess_compression(path: str) -> Optional[str]:
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("zstd compression requires the 'zstandard' package")
+    return zstandard
+
+
+def open_input(path: str, compression: Optional[str] = None):
+    """Open a text input file, transparently decompressing .gz/.zst files; '-' reads stdin."""
+    if path == "-":
+        return sys.stdin
+    compression = compression or guess_compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        reader = _require_zstandard().ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def open_output(path: str, compression: Optional[str] = None):
+    """Open a text output file, compressing .gz/.zst files or as requested; '-' writes stdout."""
+    if path == "-":
+        return sys.stdout
+    compression = compression or guess_compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8")
+    if compression == "zstd":
+        writer = _require_zstandard().ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+        return io.TextIOWrapper(writer, encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def read_jsonl(stream) -> Iterator[Any]:
+    """JSONL records; a line that is not valid JSON is passed on as is, to be rejected."""
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield line
+
+
+def read_csv(stream) -> Iterator[Dict[str, Any]]:
+    """CSV records; dataset_metadata is a JSON document, empty cells are NULL."""
+    for record in csv.DictReader(stream):
+        record = {key: value for key, value in record.items() if value not in (None, "")}
+        if "dataset_metadata" in record:
+            try:
+                record["dataset_metadata"] = json.loads(record["dataset_metadata"])
+            except json.JSONDecodeError:
+                pass  # left as text, rejected by validation
+        yield record
+
+
+def to_copy_row(record: Any) -> List[Any]:
+    """
+    Turn an input record into a staging row, in COPY_COLUMNS order. The
+    record is validated like the body of POST /metadata, so the stored
+    columns and content hash match an API ingest of the same dataset;
+    raises ValueError if it is invalid.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+    missing = [name for name in ("node", "path", "use_case") if not record.get(name)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    # dataset_metadata may be left out of a bulk-load record
+    node_dataset = validate_dataset_info({"dataset_metadata": None, **record})
+    values = {
+        "id": node_dataset.id,
+        "node": node_dataset.node,
+        "path": node_dataset.path,
+        "use_case": node_dataset.use_case,
+        "timestamp": node_dataset.timestamp.isoformat(),
+        "num_records": node_dataset.num_records,
+        "num_features": node_dataset.num_features,
+        "dataset_metadata": json.dumps(node_dataset.dataset_metadata.model_dump()) if node_dataset.dataset_metadata is not None else None,
+        "content_hash": compute_content_hash(node_dataset),
+    }
+    return [COPY_NULL if values[name] is None else values[name] for name in COPY_COLUMNS]
+
+
+def to_copy_rows(records: Iterable[Any], rejected: List[int]) -> Iterator[List[Any]]:
+    """Staging rows of the valid records; the numbers of the others are appended to `rejected`."""
+    for record_no, record in enumerate(records, start=1):
+        try:
+            yield to_copy_row(record)
+        except ValueError as e:
+            path = record.get("path") if isinstance(record, dict) else None
+            logger.warning(f"Rejected record {record_no} (path={path!r}): {e}")
+            rejected.append(record_no)
+
+
+class CopyStream:
+    """
+    File-like object producing CSV text from an iterator of rows on demand,
+    so COPY ... FROM STDIN streams the input without materializing it.
+    """
+
+    def __init__(self, rows: Iterable[List[Any]]):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._pending = ""
+        self.count = 0
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+            self.count += 1
+            if self._buffer.tell() >= 64 * 1024:
+                self._pending += self._buffer.getvalue()
+                self._buffer.seek(0)
+                self._buffer.truncate()
+
+        self._pending += self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+        if size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def load(path: str, input_format: str) -> Dict[str, int]:
+    """
+    Bulk-load datasets with COPY into a staging table, merge them into the
+    catalogue keyed on (node, path) and rebuild the use-case membership, all
+    in one transaction. Invalid records are logged and skipped, and counted
+    as `rejected`.
+    """
+    reader = read_csv if input_format == "csv" else read_jsonl
+    columns = ", ".join(COPY_COLUMNS)
+    staged_columns = ", ".join(
+        f"""CASE WHEN row_number() OVER (PARTITION BY staged.id ORDER BY staged.node, staged.path) > 1
+            OR EXISTS (
+                SELECT 1 FROM {TABLE}
+                WHERE {TABLE}.id = staged.id
+                AND ({TABLE}.node, {TABLE}.path) IS DISTINCT FROM (staged.node, staged.path)
+            )
+            THEN gen_random_uuid() ELSE staged.id END"""
+        if name == "id" else f"staged.{name}"
+        for name in COPY_COLUMNS
+    )
+
+    with open_input(path) as stream, Session(database.engine) as session:
+        connection = session.connection()
+        connection.execute(text(f"""
+            CREATE TEMP TABLE {STAGING_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS) ON COMMIT DROP
+        """))
+
+        rejected: List[int] = []
+        copy_stream = CopyStream(to_copy_rows(reader(stream), rejected))
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            copy_stream,
+        )
+        logger.info(f"Copied {copy_stream.count} records into {STAGING_TABLE}, {len(rejected)} rejected")
+
+        # the most recent record of a (node, path) in the input wins; an id
+        # already taken by another (node, path), in the catalogue or earlier
+        # in the input, is replaced by a fresh one
+        merged = connection.execute(text(f"""
+            INSERT INTO {TABLE} ({columns})
+            SELECT {staged_columns}
+            FROM (
+                SELECT DISTINCT ON (node, path) {columns}
+                FROM {STAGING_TABLE}
+                ORDER BY node, path, timestamp DESC
+            ) AS staged
+            ON CONFLICT (node, path) DO UPDATE
+            SET {", ".join(f"{name} = EXCLUDED.{name}" for name in UPDATE_COLUMNS)}
+            WHERE {TABLE}.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+            OR {TABLE}.deleted_at IS NOT NULL
+        """)).rowcount
+
+        membership = rebuild_use_case_membership(session)
+        session.commit()
+
+    return {"read": copy_stream.count + len(rejected), "rejected": len(rejected), "written": merged, **membership}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _restore_value(column, value: Any) -> Any:
+    """Convert an exported JSON value back to what the column expects."""
+    if value is None:
+        # SQL NULL rather than a JSON 'null' document for empty JSON columns
+        return null()
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if python_type is uuid_pkg.UUID and isinstance(value, str):
+        return uuid_pkg.UUID(value)
+    return value
+
+
+def export(path: str, compression: Optional[str] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Write every exported table to NDJSON, one {"table", "row"} object per line.
+
+    All tables are read from one REPEATABLE READ snapshot with server-side
+    cursors (yield_per), so memory stays constant and the dump is consistent.
+    """
+    counts: Dict[str, int] = {}
+
+    with open_output(path, compression) as stream, Session(database.engine) as session:
+        if session.get_bind().dialect.name == "postgresql":
+            session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        stream.write(json.dumps({
+            "format": EXPORT_FORMAT,
+            "version": EXPORT_VERSION,
+            "exported_at": datetime.utcnow().isoformat(),
+        }) + "\n")
+
+        for table in EXPORT_TABLES:
+            counts[table.name] = 0
+            rows = session.execute(select(table).execution_options(yield_per=batch_size))
+            for row in rows.mappings():
+                stream.write(json.dumps({"table": table.name, "row": dict(row)}, default=_json_default) + "\n")
+                counts[table.name] += 1
+            logger.info(f"Exported {counts[table.name]} rows from {table.name}")
+
+        session.rollback()
+
+    return counts
+
+
+def restore(path: str, compression: Optional[str] = None, replace: bool = False, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Restore an export produced by `export` in one transaction.
+
+    Rows already present (same primary key) are kept; with `replace` the
+    exported tables are emptied first. Rows are inserted in batches, so only
+    one batch is held in memory at a time. The catalogue statistics are
+    rebuilt from the restored datasets.
+    """
+    tables = {table.name: table for table in EXPORT_TABLES}
+    counts = {name: 0 for name in tables}
+    pending: Dict[str, List[Dict[str, Any]]] = {name: [] for name in tables}
+
+    def flush(session: Session, name: str):
+        if pending[name]:
+            postgres = session.get_bind().dialect.name == "postgresql"
+            statement = (postgresql.insert if postgres else sqlite.insert)(tables[name]).values(pending[name])
+            if tables[name] is UseCaseVersion.__table__:
+                # versions never go back, even when restoring an older export
+                greatest = func.greatest if postgres else func.max
+                statement = statement.on_conflict_do_update(
+                    index_elements=[UseCaseVersion.use_case],
+                    set_={"version": greatest(UseCaseVersion.version, statement.excluded.version)},
+                )
+            else:
+                statement = statement.on_conflict_do_nothing()
+            counts[name] += session.execute(statement).rowcount
+            pending[name] = []
+
+    with open_input(path, compression) as stream, Session(database.engine) as session:
+        header = json.loads(stream.readline() or "{}")
+        if header.get("format") != EXPORT_FORMAT:
+            raise ValueError(f"{path} is not a data catalogue export")
+        if header.get("version") != EXPORT_VERSION:
+            raise ValueError(f"Unsupported export version: {header.get('version')}")
+
+        if replace:
+            for table in reversed(EXPORT_TABLES):
+                # versions outlive their use-cases and are merged instead
+                if table is not UseCaseVersion.__table__:
+                    session.execute(delete(table))
+
+        for line in stream:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            name = entry["table"]
+            if name not in tables:
+                raise ValueError(f"Unknown table in export: {name}")
+            columns = tables[name].columns
+            pending[name].append({key: _restore_value(columns[key], value) for key, value in entry["row"].items()})
+            if len(pending[name]) >= batch_size:
+                flush(session, name)
+
+        for name in tables:
+            flush(session, name)
+        mark_use_cases_changed(session)
+        database.rebuild_catalogue_stats(session.connection())
+        session.commit()
+
+    return counts
+
+
+def rebuild_stats() -> int:
+    """Recompute catalogue_stats from the datasets, e.g. after a manual repair."""
+    with database.engine.begin() as connection:
+        return database.rebuild_catalogue_stats(connection)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Data catalogue maintenance tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load_parser = subparsers.add_parser("load", help="Bulk-load datasets from JSONL or CSV using COPY")
+    load_parser.add_argument("path", help="Input file (.jsonl or .csv, optionally .gz); '-' for stdin")
+    load_parser.add_argument("--format", choices=["jsonl", "csv"], default=None,
+                             help="Input format (default: guessed from the file extension)")
+
+    export_parser = subparsers.add_parser("export", help="Dump the catalogue to NDJSON in constant memory")
+    export_parser.add_argument("path", help="Output file; '-' for stdout")
+    export_parser.add_argument("--compression", choices=["none", "gzip", "zstd"], default=None,
+                               help="Output compression (default: guessed from the file extension)")
+
+    restore_parser = subparsers.add_parser("restore", help="Restore a catalogue export")
+    restore_parser.add_argument("path", help="Export file; '-' for stdin")
+    restore_parser.add_argument("--compression", choices=["none", "gzip", "zstd"], default=None,
+                                help="Input compression (default: guessed from the file extension)")
+    restore_parser.add_argument("--replace", action="store_true",
+                                help="Empty the exported tables before restoring")
+
+    subparsers.add_parser("stats-rebuild", help="Recompute the catalogue statistics from the datasets")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "load":
+        input_format = args.format or ("csv" if ".csv" in args.path else "jsonl")
+        counts = load(args.path, input_format)
+        logger.info(f"Load completed: {counts}")
+
+    elif args.command in ("export", "restore"):
+        compression = args.compression or guess_compression(args.path)
+        if args.command == "export":
+            counts = export(args.path, compression)
+            logger.info(f"Export completed: {counts}")
+        else:
+            counts = restore(args.path, compression, replace=args.replace)
+            logger.info(f"Restore completed: {counts}")
+
+    elif args.command == "stats-rebuild":
+        groups = rebuild_stats()
+        logger.info(f"Statistics rebuilt: {groups} groups")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
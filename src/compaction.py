@@ -0,0 +1,108 @@
+import logging
+import threading
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlmodel import Session
+
+import database
+from config import settings
+from models import NodeDatasetInfo
+from utils import database_utc_now
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def purge_tombstones(session: Session, retention_seconds: float, batch_rows: int) -> int:
+    """
+    Physically delete up to batch_rows datasets tombstoned more than
+    retention_seconds ago, oldest first, and commit. The age is measured on
+    the database clock, which also stamped deleted_at. Rows locked by a
+    concurrent writer (e.g. a re-announcement reviving them) are skipped,
+    and a row revived meanwhile no longer matches. Returns the number purged.
+    """
+    expired = (NodeDatasetInfo.deleted_at.is_not(None), NodeDatasetInfo.deleted_at < database_utc_now(session, retention_seconds))
+    batch = (
+        select(NodeDatasetInfo.id)
+        .where(*expired)
+        .order_by(NodeDatasetInfo.deleted_at)
+        .limit(batch_rows)
+        .with_for_update(skip_locked=True)
+    )
+    purged = session.execute(delete(NodeDatasetInfo).where(NodeDatasetInfo.id.in_(batch), *expired)).rowcount
+    session.commit()
+    return purged
+
+
+class TombstoneCompactor:
+    """
+    Purges expired dataset tombstones in the background.
+
+    Deletes only set deleted_at, so they are cheap single-row updates and
+    incremental consumers can see them. Once a tombstone is older than
+    retention_seconds, this thread deletes it for good, batch_rows rows per
+    transaction with pause_seconds between batches so the purge never
+    holds many row locks or saturates the database. When nothing is left to
+    purge it sleeps for interval_seconds.
+    """
+
+    def __init__(
+        self,
+        retention_seconds: float = settings.TOMBSTONE_RETENTION_SECONDS,
+        batch_rows: int = settings.COMPACTION_BATCH_ROWS,
+        pause_seconds: float = settings.COMPACTION_PAUSE_SECONDS,
+        interval_seconds: float = settings.COMPACTION_INTERVAL_SECONDS,
+        engine=None,
+    ):
+        self._retention_seconds = retention_seconds
+        self._batch_rows = batch_rows
+        self._pause_seconds = pause_seconds
+        self._interval_seconds = interval_seconds
+        self._engine = engine
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.purged = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="tombstone-compactor", daemon=True)
+        self._thread.start()
+        logger.info("Tombstone compactor started")
+
+    def stop(self, timeout: Optional[float] = 10):
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        logger.info("Tombstone compactor stopped")
+
+    def compact(self) -> int:
+        """Purge expired tombstones batch by batch until none is left or stopping."""
+        total = 0
+        while not self._stopping.is_set():
+            # the cutoff is taken per batch, so a long run keeps up with the retention window
+            with Session(self._engine or database.engine) as session:
+                purged = purge_tombstones(session, self._retention_seconds, self._batch_rows)
+            total += purged
+            self.purged += purged
+            if purged < self._batch_rows:
+                break
+            self._stopping.wait(self._pause_seconds)
+        if total:
+            logger.info(f"Purged {total} dataset tombstones")
+        return total
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Tombstone compaction failed: {e}")
+            self._stopping.wait(self._interval_seconds)
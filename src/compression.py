@@ -0,0 +1,159 @@
+import zlib
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd is only offered when installed
+    zstandard = None
+
+# preferred first when the client weighs encodings equally
+SUPPORTED_ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+# bodies of these types are already compressed or must not be buffered
+UNCOMPRESSED_MEDIA_TYPES = ("text/event-stream", "application/zstd", "application/gzip", "image/", "video/", "audio/")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the supported content-coding the client weighs highest, or None."""
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    best, best_weight = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress_body(encoding: str, level: int, body: bytes) -> bytes:
+    """Compress a complete body; zstd frames then record the content size."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    encoder = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return encoder.compress(body) + encoder.flush()
+
+
+class _Compressor:
+    """Incremental encoder whose output can be decoded up to each flush()."""
+
+    def __init__(self, encoding: str, level: int):
+        if encoding == "zstd":
+            self._encoder = zstandard.ZstdCompressor(level=level).compressobj()
+            self._sync_flush = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            # wbits 31: deflate stream with gzip header and trailer
+            self._encoder = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._sync_flush = zlib.Z_SYNC_FLUSH
+
+    def compress(self, data: bytes) -> bytes:
+        return self._encoder.compress(data) + self._encoder.flush(self._sync_flush)
+
+    def finish(self, data: bytes) -> bytes:
+        return self._encoder.compress(data) + self._encoder.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with gzip or zstd, as negotiated by Accept-Encoding.
+
+    Complete bodies below minimum_size are sent as is. Streamed bodies are
+    compressed chunk by chunk and every chunk is flushed, so a client can
+    decode each NDJSON line as soon as it arrives.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "zstd": zstd_level}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, encoding, self.levels[encoding], self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, encoding: str, level: int, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self._start: Optional[Message] = None
+        self._compressor: Optional[_Compressor] = None
+        self._passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # held back until the first body chunk tells whether to compress
+            self._start = message
+            return
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._compressor is None:
+            headers = MutableHeaders(raw=self._start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if self._start["status"] == 304:
+                # same validator as the compressed 200 this 304 stands for
+                self._weaken_etag(headers)
+            if not self._compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                self._passthrough = True
+                await self._send(self._start)
+                await self._send(message)
+                return
+
+            headers["Content-Encoding"] = self.encoding
+            self._weaken_etag(headers)
+            if not more_body:
+                body = compress_body(self.encoding, self.level, body)
+                headers["Content-Length"] = str(len(body))
+                await self._send(self._start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            self._compressor = _Compressor(self.encoding, self.level)
+            await self._send(self._start)
+
+        body = self._compressor.compress(body) if more_body else self._compressor.finish(body)
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    @staticmethod
+    def _weaken_etag(headers: MutableHeaders):
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # the compressed bytes differ, so the validator is only weakly equal
+            headers["ETag"] = f"W/{etag}"
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if self._start["status"] < 200 or self._start["status"] in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        return not headers.get("content-type", "").startswith(UNCOMPRESSED_MEDIA_TYPES)
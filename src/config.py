@@ -14,6 +14,72 @@ class Settings:
     POSTGRES_HOST: str = os.getenv("POSTGRES_HOST", "postgres_db")
     POSTGRES_PORT: str = os.getenv("POSTGRES_PORT", "5432") #5432 80
 
+    # Streaming ingest: flush to the database every N rows or every M milliseconds
+    INGEST_CHUNK_ROWS: int = int(os.getenv("INGEST_CHUNK_ROWS", "500"))
+    INGEST_CHUNK_MS: int = int(os.getenv("INGEST_CHUNK_MS", "1000"))
+    # longer lines are reported invalid and skipped instead of buffered
+    INGEST_MAX_LINE_BYTES: int = int(os.getenv("INGEST_MAX_LINE_BYTES", str(1024 * 1024)))
+
+    # Write-behind ingest (POST /metadata/queue): queued datasets are group-committed in batches;
+    # queue and receipts are per process, so poll receipts on the replica that issued them
+    ASYNC_INGEST_ENABLED: bool = os.getenv("ASYNC_INGEST_ENABLED", "false").lower() == "true"
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+    INGEST_QUEUE_BATCH_SIZE: int = int(os.getenv("INGEST_QUEUE_BATCH_SIZE", "500"))
+    INGEST_QUEUE_FLUSH_MS: int = int(os.getenv("INGEST_QUEUE_FLUSH_MS", "200"))
+    INGEST_QUEUE_MAX_RECEIPTS: int = int(os.getenv("INGEST_QUEUE_MAX_RECEIPTS", "100000"))
+
+    # Keyset pagination of the listing endpoints
+    PAGE_SIZE_DEFAULT: int = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+    PAGE_SIZE_MAX: int = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+
+    # Rows fetched per round trip when streaming NDJSON listings
+    STREAM_BATCH_ROWS: int = int(os.getenv("STREAM_BATCH_ROWS", "1000"))
+
+    # Text search configuration of the full-text index (e.g. english, italian, simple);
+    # the index keeps the configuration it was created with
+    FULLTEXT_SEARCH_CONFIG: str = os.getenv("FULLTEXT_SEARCH_CONFIG", "english")
+
+    # In-process cache of the use-case reads (0 disables it)
+    USECASE_CACHE_SIZE: int = int(os.getenv("USECASE_CACHE_SIZE", "1024"))
+    USECASE_CACHE_TTL_SECONDS: float = float(os.getenv("USECASE_CACHE_TTL_SECONDS", "60"))
+
+    # Cross-replica cache invalidation through PostgreSQL LISTEN/NOTIFY
+    CACHE_SYNC_ENABLED: bool = os.getenv("CACHE_SYNC_ENABLED", "true").lower() == "true"
+    CACHE_NOTIFY_CHANNEL: str = os.getenv("CACHE_NOTIFY_CHANNEL", "data_catalogue_cache")
+    CACHE_SYNC_RECONNECT_SECONDS: float = float(os.getenv("CACHE_SYNC_RECONNECT_SECONDS", "5"))
+    CACHE_SYNC_HEARTBEAT_SECONDS: float = float(os.getenv("CACHE_SYNC_HEARTBEAT_SECONDS", "30"))
+
+    # Background jobs (bulk deletes, rebuilds) run by a bounded worker pool
+    JOBS_ENABLED: bool = os.getenv("JOBS_ENABLED", "true").lower() == "true"
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_BATCH_ROWS: int = int(os.getenv("JOB_BATCH_ROWS", "5000"))
+    JOB_POLL_SECONDS: float = float(os.getenv("JOB_POLL_SECONDS", "5"))
+    # A job whose runner stopped renewing its lease is taken over by another runner
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+    # A job taken over this many times (its runner kept dying, e.g. out of memory) is failed
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+    # Soft delete: tombstones stay visible to incremental consumers (GET /metadata/deleted)
+    # for the retention period, then compaction purges them in throttled batches
+    TOMBSTONE_RETENTION_SECONDS: float = float(os.getenv("TOMBSTONE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+    # Tombstones are stamped with the database clock when their statement runs, not when it
+    # commits; the feed holds back the most recent ones so that slower deletes committing
+    # within this lag are not skipped by a consumer that already moved its cursor past them
+    TOMBSTONE_FEED_LAG_SECONDS: float = float(os.getenv("TOMBSTONE_FEED_LAG_SECONDS", "30"))
+    COMPACTION_ENABLED: bool = os.getenv("COMPACTION_ENABLED", "true").lower() == "true"
+    COMPACTION_BATCH_ROWS: int = int(os.getenv("COMPACTION_BATCH_ROWS", "500"))
+    COMPACTION_PAUSE_SECONDS: float = float(os.getenv("COMPACTION_PAUSE_SECONDS", "0.5"))
+    COMPACTION_INTERVAL_SECONDS: float = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "300"))
+
+    # How long a bulk delete waits for its table locks before giving up
+    BULK_DELETE_LOCK_TIMEOUT_SECONDS: float = float(os.getenv("BULK_DELETE_LOCK_TIMEOUT_SECONDS", "10"))
+
+    # Response compression negotiated through Accept-Encoding (gzip, and zstd when installed)
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MINIMUM_SIZE: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+    GZIP_COMPRESSION_LEVEL: int = int(os.getenv("GZIP_COMPRESSION_LEVEL", "6"))
+    ZSTD_COMPRESSION_LEVEL: int = int(os.getenv("ZSTD_COMPRESSION_LEVEL", "3"))
+
 settings = Settings()
 
 # Keycloak
@@ -1,8 +1,9 @@
 from sqlmodel import create_engine, SQLModel, Session
 from config import settings
-from models import NodeDatasetInfo
+from models import CATALOGUE_FACETS, INDEXED_METADATA_FIELDS, NodeDatasetInfo
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy import text
+from typing import List, Tuple
 
 #postgres_arg = "postgres:password_prova@localhost:5432/dataset_catalogue"
 #postgres_url = f"postgresql://{postgres_arg}"
@@ -239,9 +240,487 @@ def migrate_schema_and_metadata_columns():
             print("Migration failed:", e)
             raise
 
+def add_content_hash_and_node_path_key():
+    """
+    Adds the content_hash column and makes (node, path) unique.
+    Duplicated announcements are collapsed first, keeping the latest row.
+    """
+    with engine.connect() as connection:
+        try:
+            connection.execute(text("""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'nodedatasetinfo'
+                        AND column_name = 'content_hash'
+                    ) THEN
+                        ALTER TABLE nodedatasetinfo
+                        ADD COLUMN content_hash VARCHAR;
+                    END IF;
+                END $$;
+            """))
+
+            connection.execute(text("""
+                DELETE FROM nodedatasetinfo
+                WHERE ctid IN (
+                    SELECT ctid FROM (
+                        SELECT ctid, row_number() OVER (
+                            PARTITION BY node, path
+                            ORDER BY timestamp DESC NULLS LAST, id DESC
+                        ) AS rn
+                        FROM nodedatasetinfo
+                    ) AS ranked
+                    WHERE ranked.rn > 1
+                );
+            """))
+
+            connection.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_nodedatasetinfo_node_path
+                ON nodedatasetinfo (node, path);
+            """))
+
+            connection.commit()
+            print("Content hash and (node, path) key migration completed!")
+
+        except ProgrammingError as e:
+            connection.rollback()
+            print(f"SQL error while adding (node, path) key: {e}")
+
+        except Exception as e:
+            connection.rollback()
+            print(f"Unexpected error: {e}")
+
+def add_soft_delete_column():
+    """
+    Adds the deleted_at tombstone column and the partial index of
+    tombstones, read by GET /metadata/deleted and by compaction.
+    """
+    with engine.connect() as connection:
+        try:
+            connection.execute(text("""
+                ALTER TABLE nodedatasetinfo
+                ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITHOUT TIME ZONE;
+            """))
+
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_nodedatasetinfo_deleted_at_id
+                ON nodedatasetinfo (deleted_at, id)
+                WHERE deleted_at IS NOT NULL;
+            """))
+
+            connection.commit()
+            print("Soft delete column added!")
+
+        except ProgrammingError as e:
+            connection.rollback()
+            print(f"SQL error while adding soft delete column: {e}")
+
+        except Exception as e:
+            connection.rollback()
+            print(f"Unexpected error: {e}")
+
+
+def add_pagination_index():
+    """
+    Adds the id index used to page through live datasets, replacing the
+    earlier (timestamp, id) indexes: the timestamp changes when a dataset
+    is re-announced, so it cannot key the pages.
+    """
+    with engine.connect() as connection:
+        try:
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_nodedatasetinfo_live_id
+                ON nodedatasetinfo (id)
+                WHERE deleted_at IS NULL;
+            """))
+
+            connection.execute(text("DROP INDEX IF EXISTS ix_nodedatasetinfo_live_timestamp_id;"))
+            connection.execute(text("DROP INDEX IF EXISTS ix_nodedatasetinfo_timestamp_id;"))
+
+            connection.commit()
+            print("Pagination index created!")
+
+        except ProgrammingError as e:
+            connection.rollback()
+            print(f"SQL error while creating pagination index: {e}")
+
+        except Exception as e:
+            connection.rollback()
+            print(f"Unexpected error: {e}")
+
+def add_path_index():
+    """Adds the index used by lookups and deletes of datasets by path."""
+    with engine.connect() as connection:
+        try:
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_nodedatasetinfo_path
+                ON nodedatasetinfo (path);
+            """))
+
+            connection.commit()
+            print("Path index created!")
+
+        except ProgrammingError as e:
+            connection.rollback()
+            print(f"SQL error while creating path index: {e}")
+
+        except Exception as e:
+            connection.rollback()
+            print(f"Unexpected error: {e}")
+
+def add_metadata_search_indexes():
+    """
+    Converts dataset_metadata to JSONB and adds the indexes used by
+    GET /metadata/search: the GIN index serves any combination of metadata
+    filters, the btree expression indexes the most selective keys alone.
+    """
+    with engine.connect() as connection:
+        try:
+            connection.execute(text("""
+                DO $$
+                BEGIN
+                    IF EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'nodedatasetinfo'
+                        AND column_name = 'dataset_metadata'
+                        AND data_type = 'json'
+                    ) THEN
+                        ALTER TABLE nodedatasetinfo
+                        ALTER COLUMN dataset_metadata TYPE JSONB
+                        USING dataset_metadata::jsonb;
+                    END IF;
+                END $$;
+            """))
+
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_nodedatasetinfo_dataset_metadata
+                ON nodedatasetinfo USING gin (dataset_metadata jsonb_path_ops);
+            """))
+
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_nodedatasetinfo_use_case
+                ON nodedatasetinfo (use_case);
+            """))
+
+            for field in INDEXED_METADATA_FIELDS:
+                connection.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS ix_nodedatasetinfo_metadata_{field.lower()}
+                    ON nodedatasetinfo ((dataset_metadata ->> '{field}'))
+                    WHERE deleted_at IS NULL;
+                """))
+
+            connection.commit()
+            print("Metadata search indexes created!")
+
+        except ProgrammingError as e:
+            connection.rollback()
+            print(f"SQL error while creating metadata search indexes: {e}")
+
+        except Exception as e:
+            connection.rollback()
+            print(f"Unexpected error: {e}")
+
+def add_fulltext_search_column():
+    """
+    Adds the generated search_vector column (title, description, keyword and
+    purpose of dataset_metadata) and its GIN index, used by
+    GET /metadata/fulltext. The column is maintained by PostgreSQL and is
+    not part of the NodeDatasetInfo model.
+
+    The text search configuration is fixed into the generation expression
+    when the column is created: changing FULLTEXT_SEARCH_CONFIG later only
+    affects how queries are parsed, until the column is dropped and this
+    migration runs again.
+    """
+    config = settings.FULLTEXT_SEARCH_CONFIG
+    with engine.connect() as connection:
+        try:
+            connection.execute(text("""
+                ALTER TABLE nodedatasetinfo
+                ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector(CAST(:config AS regconfig), coalesce(dataset_metadata->>'title', '')), 'A') ||
+                    setweight(to_tsvector(CAST(:config AS regconfig), coalesce(dataset_metadata->>'keyword', '')), 'B') ||
+                    setweight(to_tsvector(CAST(:config AS regconfig), coalesce(dataset_metadata->>'description', '')), 'C') ||
+                    setweight(to_tsvector(CAST(:config AS regconfig), coalesce(dataset_metadata->>'purpose', '')), 'D')
+                ) STORED;
+            """), {"config": config})
+
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_nodedatasetinfo_search_vector
+                ON nodedatasetinfo USING gin (search_vector);
+            """))
+
+            connection.commit()
+            print("Full-text search column created!")
+
+        except ProgrammingError as e:
+            connection.rollback()
+            print(f"SQL error while creating full-text search column: {e}")
+
+        except Exception as e:
+            connection.rollback()
+            print(f"Unexpected error: {e}")
+
+# comment set on usecases.datasets once its documents are copied to usecase_datasets
+USECASE_DATASETS_BACKFILL_MARKER = "legacy: backfilled into usecase_datasets"
+
+def backfill_usecase_datasets():
+    """
+    Copies the legacy usecases.datasets JSON documents (node -> list of URLs)
+    into usecase_datasets rows, once. The legacy column is left intact so a
+    rollback to the previous release still finds its data; a comment on it
+    records that the copy was done, so memberships removed afterwards are not
+    brought back on the next startup. Drop the column in a later migration
+    once usecase_datasets is confirmed.
+    """
+    with engine.connect() as connection:
+        try:
+            backfilled = connection.execute(text("""
+                SELECT col_description('usecases'::regclass, attnum) = :marker
+                FROM pg_attribute
+                WHERE attrelid = 'usecases'::regclass AND attname = 'datasets';
+            """), {"marker": USECASE_DATASETS_BACKFILL_MARKER}).scalar()
+            if backfilled:
+                return
+
+            connection.execute(text("""
+                INSERT INTO usecase_datasets (use_case, node, dataset)
+                SELECT uc.use_case, entry.node, url.dataset
+                FROM usecases AS uc
+                CROSS JOIN LATERAL jsonb_each(
+                    CASE WHEN jsonb_typeof(uc.datasets::jsonb) = 'object'
+                         THEN uc.datasets::jsonb ELSE '{}'::jsonb END
+                ) AS entry(node, urls)
+                CROSS JOIN LATERAL jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(entry.urls) = 'array'
+                         THEN entry.urls ELSE '[]'::jsonb END
+                ) AS url(dataset)
+                ON CONFLICT DO NOTHING;
+            """))
+
+            connection.execute(text(
+                f"COMMENT ON COLUMN usecases.datasets IS '{USECASE_DATASETS_BACKFILL_MARKER}'"
+            ))
+
+            connection.commit()
+            print("Use-case datasets backfill completed!")
+
+        except Exception as e:
+            connection.rollback()
+            print("Backfill failed:", e)
+            raise
+
+
+# transition tables of the catalogue_stats triggers, per event
+CATALOGUE_STATS_TRIGGERS = {
+    "INSERT": "REFERENCING NEW TABLE AS new_rows",
+    "UPDATE": "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "REFERENCING OLD TABLE AS old_rows",
+}
+
+# catalogue_stats counters, as aggregates of dataset rows
+CATALOGUE_STATS_AGGREGATES = {
+    "datasets": "count(*)",
+    "num_records_sum": "coalesce(sum(num_records), 0)",
+    "num_records_count": "count(num_records)",
+    "num_features_sum": "coalesce(sum(num_features), 0)",
+    "num_features_sq_sum": "coalesce(sum(CAST(num_features AS BIGINT) * num_features), 0)",
+    "num_features_count": "count(num_features)",
+}
+
+
+def _catalogue_facets_values(rows: str) -> str:
+    """FROM/WHERE clause listing the (facet, value) pairs of the live rows of a set."""
+    facet_values = ", ".join(f"('{facet}', {expression})" for facet, expression in CATALOGUE_FACETS.items())
+    return f"""
+        FROM {rows} CROSS JOIN LATERAL (VALUES {facet_values}) AS v(facet, value)
+        WHERE v.value IS NOT NULL AND deleted_at IS NULL
+    """
+
+
+def _catalogue_facets_select(sign: str, rows: str) -> str:
+    """Per-facet value counts of a set of dataset rows, signed."""
+    return f"""
+        SELECT v.facet, v.value, {sign}count(*) AS datasets
+        {_catalogue_facets_values(rows)}
+        GROUP BY v.facet, v.value
+    """
+
+
+def _catalogue_facets_delta(sources: List[Tuple[str, str]]) -> str:
+    """
+    Add (sign "") or subtract (sign "-") the facet counts of the (sign,
+    transition table) sources in one statement. Counter rows are locked in
+    key order, so concurrent writers cannot deadlock on them.
+    """
+    counts = " UNION ALL ".join(_catalogue_facets_select(sign, rows) for sign, rows in sources)
+    return f"""
+        INSERT INTO catalogue_facets AS f (facet, value, datasets)
+        SELECT facet, value, sum(datasets)
+        FROM ({counts}) AS delta
+        GROUP BY facet, value
+        ORDER BY facet, value
+        ON CONFLICT (facet, value) DO UPDATE SET datasets = f.datasets + EXCLUDED.datasets;
+    """
+
+
+def _catalogue_stats_delta(sources: List[Tuple[str, str]]) -> str:
+    """
+    Add (sign "") or subtract (sign "-") the rollups of the (sign,
+    transition table) sources in one statement, locking the counter rows in
+    key order like _catalogue_facets_delta.
+    """
+    rollups = " UNION ALL ".join(f"""
+        SELECT use_case, node, {", ".join(f"{sign}{aggregate} AS {column}" for column, aggregate in CATALOGUE_STATS_AGGREGATES.items())}
+        FROM {rows}
+        WHERE deleted_at IS NULL
+        GROUP BY use_case, node
+    """ for sign, rows in sources)
+    return f"""
+        INSERT INTO catalogue_stats AS s (use_case, node, {", ".join(CATALOGUE_STATS_AGGREGATES)})
+        SELECT use_case, node, {", ".join(f"sum({column})" for column in CATALOGUE_STATS_AGGREGATES)}
+        FROM ({rollups}) AS delta
+        GROUP BY use_case, node
+        ORDER BY use_case, node
+        ON CONFLICT (use_case, node) DO UPDATE SET
+            {", ".join(f"{column} = s.{column} + EXCLUDED.{column}" for column in CATALOGUE_STATS_AGGREGATES)};
+    """
+
+
+def _catalogue_counters_cleanup(rows: str) -> str:
+    """
+    Delete the counter rows that a subtraction of `rows` left at zero. Only
+    the keys of those rows are looked up, through the primary keys, so a
+    write statement never scans the counter tables.
+    """
+    return f"""
+        DELETE FROM catalogue_stats AS s
+        USING (SELECT DISTINCT use_case, node FROM {rows} WHERE deleted_at IS NULL) AS touched
+        WHERE s.use_case = touched.use_case AND s.node = touched.node AND s.datasets <= 0;
+        DELETE FROM catalogue_facets AS f
+        USING (SELECT DISTINCT v.facet, v.value {_catalogue_facets_values(rows)}) AS touched
+        WHERE f.facet = touched.facet AND f.value = touched.value AND f.datasets <= 0;
+    """
+
+
+def rebuild_catalogue_stats(connection) -> int:
+    """
+    Recompute catalogue_stats (and, on PostgreSQL, catalogue_facets) from
+    nodedatasetinfo, without committing.
+    Writes to nodedatasetinfo wait until the transaction ends, so no trigger
+    update can be lost in between. Returns the number of groups.
+    """
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("LOCK TABLE nodedatasetinfo IN SHARE MODE"))
+        # facet counters are only maintained by the PostgreSQL triggers
+        connection.execute(text("DELETE FROM catalogue_facets"))
+        connection.execute(text(f"""
+            INSERT INTO catalogue_facets (facet, value, datasets)
+            {_catalogue_facets_select("", "nodedatasetinfo")}
+        """))
+    connection.execute(text("DELETE FROM catalogue_stats"))
+    return connection.execute(text(f"""
+        INSERT INTO catalogue_stats (use_case, node, {", ".join(CATALOGUE_STATS_AGGREGATES)})
+        SELECT use_case, node, {", ".join(CATALOGUE_STATS_AGGREGATES.values())}
+        FROM nodedatasetinfo
+        WHERE deleted_at IS NULL
+        GROUP BY use_case, node
+    """)).rowcount
+
+
+def install_catalogue_stats_triggers():
+    """
+    Installs the statement-level triggers keeping catalogue_stats and
+    catalogue_facets up to date.
+    Each INSERT/UPDATE/DELETE on nodedatasetinfo applies the rollup of the
+    live (not tombstoned) rows of its transition tables, so a bulk statement
+    costs one aggregate, not one update per row; tombstoning a row subtracts
+    it and purging a tombstone changes nothing. TRUNCATE empties the stats. The stats are rebuilt
+    the first time the triggers are installed.
+    """
+    with engine.connect() as connection:
+        try:
+            installed = connection.execute(text("""
+                SELECT count(*) FROM pg_trigger
+                WHERE tgrelid = 'nodedatasetinfo'::regclass
+                AND tgname LIKE 'catalogue_stats_%'
+            """)).scalar()
+            # facet counters were added after the first version of the triggers
+            facets_missing = connection.execute(text("""
+                SELECT NOT EXISTS (SELECT 1 FROM catalogue_facets)
+                AND EXISTS (SELECT 1 FROM nodedatasetinfo)
+            """)).scalar()
+
+            connection.execute(text(f"""
+                CREATE OR REPLACE FUNCTION catalogue_stats_apply() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'INSERT' THEN
+                        {_catalogue_stats_delta([("", "new_rows")])}
+                        {_catalogue_facets_delta([("", "new_rows")])}
+                    ELSIF TG_OP = 'DELETE' THEN
+                        {_catalogue_stats_delta([("-", "old_rows")])}
+                        {_catalogue_facets_delta([("-", "old_rows")])}
+                        {_catalogue_counters_cleanup("old_rows")}
+                    ELSE
+                        {_catalogue_stats_delta([("-", "old_rows"), ("", "new_rows")])}
+                        {_catalogue_facets_delta([("-", "old_rows"), ("", "new_rows")])}
+                        {_catalogue_counters_cleanup("old_rows")}
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+            """))
+
+            connection.execute(text("""
+                CREATE OR REPLACE FUNCTION catalogue_stats_truncate() RETURNS trigger AS $$
+                BEGIN
+                    DELETE FROM catalogue_stats;
+                    DELETE FROM catalogue_facets;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+            """))
+
+            # the functions above are replaced in place; triggers only when missing
+            if installed < len(CATALOGUE_STATS_TRIGGERS) + 1:
+                for event, referencing in CATALOGUE_STATS_TRIGGERS.items():
+                    name = f"catalogue_stats_{event.lower()}"
+                    connection.execute(text(f"DROP TRIGGER IF EXISTS {name} ON nodedatasetinfo"))
+                    connection.execute(text(f"""
+                        CREATE TRIGGER {name}
+                        AFTER {event} ON nodedatasetinfo
+                        {referencing}
+                        FOR EACH STATEMENT EXECUTE FUNCTION catalogue_stats_apply();
+                    """))
+
+                connection.execute(text("DROP TRIGGER IF EXISTS catalogue_stats_truncate ON nodedatasetinfo"))
+                connection.execute(text("""
+                    CREATE TRIGGER catalogue_stats_truncate
+                    AFTER TRUNCATE ON nodedatasetinfo
+                    FOR EACH STATEMENT EXECUTE FUNCTION catalogue_stats_truncate();
+                """))
+
+            if installed < len(CATALOGUE_STATS_TRIGGERS) + 1 or facets_missing:
+                groups = rebuild_catalogue_stats(connection)
+                print(f"Catalogue statistics rebuilt: {groups} groups")
+
+            connection.commit()
+            print("Catalogue statistics triggers installed!")
+
+        except ProgrammingError as e:
+            connection.rollback()
+            print(f"SQL error while installing catalogue statistics triggers: {e}")
+
+        except Exception as e:
+            connection.rollback()
+            print(f"Unexpected error: {e}")
 
 def get_session():
-    return Session(engine)
+    # closed after the response, so no request leaves its connection idle in a transaction
+    with Session(engine) as session:
+        yield session
 
 
 
@@ -0,0 +1,172 @@
+import logging
+import queue
+import threading
+import time
+import uuid as uuid_pkg
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlmodel import Session
+
+import database
+from config import settings
+from models import NodeDatasetInfo, NodeDatasetInfoBase
+from utils import save_dataset_batch_to_database, validate_dataset_info
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(Exception):
+    """Raised when the write-behind queue cannot accept more datasets."""
+
+
+class IngestQueue:
+    """
+    Write-behind ingest queue.
+
+    Datasets are put on a bounded in-process queue and acknowledged with a
+    receipt id. A background thread group-commits them in batches through
+    save_dataset_batch_to_database, so request latency does not depend on
+    per-row commit cost.
+
+    Both the queue and the receipts live in the memory of this process:
+    with several replicas a receipt is only known to the replica that
+    issued it, and datasets still queued when a replica dies are lost
+    (stop() logs those it could not flush in time).
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.INGEST_QUEUE_SIZE,
+        batch_size: int = settings.INGEST_QUEUE_BATCH_SIZE,
+        flush_interval_ms: int = settings.INGEST_QUEUE_FLUSH_MS,
+        max_receipts: int = settings.INGEST_QUEUE_MAX_RECEIPTS,
+        engine=None,
+    ):
+        self._queue: "queue.Queue[Tuple[str, NodeDatasetInfo]]" = queue.Queue(maxsize=max_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_ms / 1000
+        self._max_receipts = max_receipts
+        self._engine = engine
+        self._receipts: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background flusher."""
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+        self._thread.start()
+        logger.info("Write-behind ingest queue started")
+
+    def stop(self, timeout: Optional[float] = 30):
+        """Flush everything still queued, then stop the background flusher."""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if not self.running:
+            logger.info("Write-behind ingest queue stopped")
+            return
+
+        with self._queue.mutex:
+            left = list(self._queue.queue)
+        logger.error(f"Write-behind ingest queue not flushed within {timeout}s, {len(left)} datasets left queued")
+        for receipt_id, node_dataset in left:
+            logger.error(f"Unflushed dataset: receipt={receipt_id} node={node_dataset.node} path={node_dataset.path}")
+
+    def submit(self, node_dataset: NodeDatasetInfo) -> str:
+        """
+        Queue a dataset and return its receipt id. Raises ValueError if the
+        dataset is not valid and IngestQueueFull if the queue is full.
+        """
+        # an invalid dataset would otherwise fail the group commit of its batch
+        validate_dataset_info({name: getattr(node_dataset, name) for name in NodeDatasetInfoBase.model_fields})
+
+        receipt_id = str(uuid_pkg.uuid4())
+        self._set_receipt(receipt_id, {
+            "receipt_id": receipt_id,
+            "status": "queued",
+            "node": node_dataset.node,
+            "path": node_dataset.path,
+            "use_case": node_dataset.use_case,
+        })
+
+        try:
+            self._queue.put_nowait((receipt_id, node_dataset))
+        except queue.Full:
+            with self._lock:
+                self._receipts.pop(receipt_id, None)
+            raise IngestQueueFull()
+
+        return receipt_id
+
+    def status(self, receipt_id: str) -> Optional[Dict[str, Any]]:
+        """Return the receipt of a queued dataset, or None if unknown or expired."""
+        with self._lock:
+            receipt = self._receipts.get(receipt_id)
+            return dict(receipt) if receipt else None
+
+    def _set_receipt(self, receipt_id: str, receipt: Dict[str, Any]):
+        with self._lock:
+            self._receipts[receipt_id] = receipt
+            self._receipts.move_to_end(receipt_id)
+            # keep only the most recent receipts
+            while len(self._receipts) > self._max_receipts:
+                self._receipts.popitem(last=False)
+
+    def _update_receipt(self, receipt_id: str, **changes):
+        with self._lock:
+            if receipt_id in self._receipts:
+                self._receipts[receipt_id].update(changes)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+
+    def _take_batch(self) -> List[Tuple[str, NodeDatasetInfo]]:
+        """Collect up to batch_size datasets, waiting at most one flush interval."""
+        batch = []
+        deadline = time.monotonic() + self._flush_interval
+        while len(batch) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _save(self, batch: List[Tuple[str, NodeDatasetInfo]]):
+        with Session(self._engine or database.engine) as session:
+            results = save_dataset_batch_to_database(session, [node_dataset for _, node_dataset in batch])
+        for (receipt_id, _), result in zip(batch, results):
+            self._update_receipt(receipt_id, status=result["status"], id=result["id"])
+
+    def _flush(self, batch: List[Tuple[str, NodeDatasetInfo]]):
+        try:
+            self._save(batch)
+            logger.info(f"Group-committed {len(batch)} queued datasets")
+            return
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} queued datasets failed, retrying one by one: {getattr(e, 'detail', str(e))}")
+
+        # only the datasets that fail on their own are marked as failed
+        for item in batch:
+            try:
+                self._save([item])
+            except Exception as e:
+                detail = getattr(e, "detail", str(e))
+                logger.error(f"Queued dataset path={item[1].path} failed: {detail}")
+                self._update_receipt(item[0], status="failed", detail=detail)
@@ -0,0 +1,340 @@
+import logging
+import threading
+import uuid as uuid_pkg
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Set
+
+from sqlalchemy import func, or_, select, update
+from sqlmodel import Session
+
+import database
+from cache import INSTANCE_ID, invalidate_use_cases, use_case_cache
+from config import settings
+from models import Job, JobStatus, NodeDatasetInfo
+from utils import dataset_selector_conditions, delete_datasets, rebuild_use_case_membership
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# jobs a runner may claim: not started yet, or started by a runner whose lease expired
+CLAIMABLE_STATUSES = (JobStatus.queued, JobStatus.running)
+
+
+class JobStep(NamedTuple):
+    """Outcome of one batch of a job, committed together with its work."""
+    processed: int
+    checkpoint: Optional[Dict[str, Any]]
+    done: bool
+    # use-cases whose cached reads the batch invalidated; None for all of them
+    changed_use_cases: Optional[Sequence[str]] = ()
+
+
+class JobHandler:
+    """
+    A kind of background job.
+
+    step(session, params, checkpoint, batch_rows) does one batch of work
+    without committing and returns a JobStep; it is called until it
+    reports done, and must pick up from any checkpoint it returned.
+    validate(params) raises ValueError on bad parameters; total(session,
+    params) estimates the amount of work for progress reporting.
+    """
+
+    def __init__(
+        self,
+        step: Callable[[Session, Dict[str, Any], Optional[Dict[str, Any]], int], JobStep],
+        validate: Optional[Callable[[Dict[str, Any]], None]] = None,
+        total: Optional[Callable[[Session, Dict[str, Any]], Optional[int]]] = None,
+    ):
+        self.step = step
+        self.validate = validate
+        self.total = total
+
+
+def _validate_delete_datasets(params: Dict[str, Any]):
+    unknown = set(params) - {"node", "use_case"}
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(sorted(unknown))}")
+    dataset_selector_conditions(params.get("node"), params.get("use_case"))
+
+
+def _count_datasets(session: Session, params: Dict[str, Any]) -> int:
+    conditions = dataset_selector_conditions(params.get("node"), params.get("use_case"))
+    return session.execute(select(func.count()).select_from(NodeDatasetInfo).where(*conditions)).scalar_one()
+
+
+def _delete_datasets_step(session: Session, params: Dict[str, Any], checkpoint: Optional[Dict[str, Any]], batch_rows: int) -> JobStep:
+    # deleted rows no longer match the selectors, so the checkpoint only carries the totals
+    deleted, use_cases = delete_datasets(session, params.get("node"), params.get("use_case"), limit=batch_rows)
+    totals = {key: (checkpoint or {}).get(key, 0) + count for key, count in deleted.items()}
+    return JobStep(deleted["datasets"], totals, deleted["datasets"] < batch_rows, use_cases)
+
+
+def _rebuild_membership_step(session: Session, params: Dict[str, Any], checkpoint: Optional[Dict[str, Any]], batch_rows: int) -> JobStep:
+    # bumps every use-case version itself
+    membership = rebuild_use_case_membership(session)
+    return JobStep(membership["added"] + membership["removed"], membership, True, None)
+
+
+def _rebuild_stats_step(session: Session, params: Dict[str, Any], checkpoint: Optional[Dict[str, Any]], batch_rows: int) -> JobStep:
+    groups = database.rebuild_catalogue_stats(session.connection())
+    return JobStep(groups, {"groups": groups}, True)
+
+
+JOB_HANDLERS: Dict[str, JobHandler] = {
+    "delete_datasets": JobHandler(_delete_datasets_step, _validate_delete_datasets, _count_datasets),
+    "rebuild_use_case_membership": JobHandler(_rebuild_membership_step),
+    "rebuild_catalogue_stats": JobHandler(_rebuild_stats_step),
+}
+
+
+def job_status(job: Job) -> Dict[str, Any]:
+    """Public view of a job record."""
+    progress = None
+    if job.total:
+        progress = min(job.processed / job.total, 1.0)
+    elif job.status == JobStatus.succeeded:
+        progress = 1.0
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": job.params,
+        "status": job.status,
+        "processed": job.processed,
+        "total": job.total,
+        "progress": progress,
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class JobRunner:
+    """
+    Runs background jobs persisted in the jobs table.
+
+    A poller claims queued jobs, and jobs whose runner let its lease
+    expire, up to the number of free workers, and hands them to a bounded
+    thread pool. Each batch commits the handler's work together with the
+    job's progress, checkpoint and renewed lease, so a job survives pod
+    restarts and is never run by two runners at once. On shutdown the
+    current batches finish and the leases are released, so the next
+    runner resumes the jobs immediately. A job whose lease expired
+    max_attempts times (its runner kept crashing) is failed instead of
+    being taken over again.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.JOB_WORKERS,
+        batch_rows: int = settings.JOB_BATCH_ROWS,
+        poll_seconds: float = settings.JOB_POLL_SECONDS,
+        lease_seconds: float = settings.JOB_LEASE_SECONDS,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        handlers: Optional[Dict[str, JobHandler]] = None,
+        engine=None,
+    ):
+        self._workers = workers
+        self._batch_rows = batch_rows
+        self._poll_seconds = poll_seconds
+        self._lease = timedelta(seconds=lease_seconds)
+        self._max_attempts = max_attempts
+        self._handlers = handlers if handlers is not None else JOB_HANDLERS
+        self._engine = engine
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._active: Set[uuid_pkg.UUID] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the poller and the worker pool."""
+        if self.running:
+            return
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="job-worker")
+        self._thread = threading.Thread(target=self._poll, name="job-poller", daemon=True)
+        self._thread.start()
+        logger.info(f"Job runner started with {self._workers} workers")
+
+    def stop(self, timeout: Optional[float] = 30):
+        """Let the running batches finish, release their jobs and stop."""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        logger.info("Job runner stopped")
+
+    def submit(self, session: Session, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        Persist a new job and wake the poller. Raises KeyError for an
+        unknown kind and ValueError for invalid parameters.
+        """
+        handler = self._handlers[kind]
+        params = params or {}
+        if handler.validate is not None:
+            handler.validate(params)
+
+        job = Job(kind=kind, params=params)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        self._wake.set()
+        return job
+
+    def _session(self) -> Session:
+        return Session(self._engine or database.engine)
+
+    def _poll(self):
+        while not self._stopping.is_set():
+            try:
+                self._claim_jobs()
+            except Exception as e:
+                logger.error(f"Claiming jobs failed: {e}")
+            self._wake.wait(self._poll_seconds)
+            self._wake.clear()
+
+    def _claim_jobs(self):
+        with self._lock:
+            free = self._workers - len(self._active)
+        if free <= 0:
+            return
+
+        with self._session() as session:
+            now = datetime.utcnow()
+            claimable = (
+                Job.status.in_(CLAIMABLE_STATUSES),
+                or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now),
+            )
+            self._fail_exhausted_jobs(session, claimable, now)
+
+            candidates = session.execute(
+                select(Job.id).where(*claimable).order_by(Job.created_at).limit(free)
+            ).scalars().all()
+
+            for job_id in candidates:
+                # compare-and-set: another runner may claim the same job concurrently
+                claimed = session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, *claimable)
+                    .values(
+                        status=JobStatus.running,
+                        owner=INSTANCE_ID,
+                        lease_expires_at=now + self._lease,
+                        attempts=Job.attempts + 1,
+                        started_at=func.coalesce(Job.started_at, now),
+                        updated_at=now,
+                    )
+                ).rowcount
+                session.commit()
+                if claimed:
+                    with self._lock:
+                        self._active.add(job_id)
+                    self._executor.submit(self._run, job_id)
+
+    def _fail_exhausted_jobs(self, session: Session, claimable, now: datetime):
+        """Fail the claimable jobs already run max_attempts times instead of running them again."""
+        exhausted = session.execute(
+            select(Job.id, Job.attempts, Job.owner, Job.lease_expires_at)
+            .where(*claimable, Job.attempts >= self._max_attempts)
+        ).all()
+        for job_id, attempts, owner, lease_expires_at in exhausted:
+            error = f"Gave up after {attempts} attempts: the lease of runner {owner} expired at {lease_expires_at} before the job finished"
+            failed = session.execute(
+                update(Job)
+                .where(Job.id == job_id, *claimable)
+                .values(status=JobStatus.failed, error=error, owner=None, lease_expires_at=None, updated_at=now, finished_at=now)
+            ).rowcount
+            session.commit()
+            if failed:
+                logger.error(f"Job {job_id} failed: {error}")
+
+    def _run(self, job_id: uuid_pkg.UUID):
+        try:
+            while self._run_step(job_id) and not self._stopping.is_set():
+                pass
+            if self._stopping.is_set():
+                self._release(job_id)
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+            self._wake.set()
+
+    def _run_step(self, job_id: uuid_pkg.UUID) -> bool:
+        """Run one batch of the job; returns whether there is more to do."""
+        with self._session() as session:
+            try:
+                # the row lock keeps a runner that took over an expired lease out until this batch commits
+                job = session.get(Job, job_id, with_for_update=True)
+                if job is None or job.owner != INSTANCE_ID or job.status != JobStatus.running:
+                    logger.warning(f"Job {job_id} is no longer owned by this runner")
+                    return False
+
+                handler = self._handlers[job.kind]
+                if job.total is None and handler.total is not None:
+                    job.total = handler.total(session, job.params)
+
+                step = handler.step(session, job.params, job.checkpoint, self._batch_rows)
+
+                now = datetime.utcnow()
+                job.processed += step.processed
+                job.checkpoint = step.checkpoint
+                job.updated_at = now
+                kind, processed = job.kind, job.processed
+                if step.done:
+                    job.status = JobStatus.succeeded
+                    job.result = step.checkpoint
+                    job.finished_at = now
+                    job.owner = None
+                    job.lease_expires_at = None
+                else:
+                    job.lease_expires_at = now + self._lease
+                session.add(job)
+                session.commit()
+
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Job {job_id} failed: {e}")
+                self._fail(job_id, getattr(e, "detail", str(e)))
+                return False
+
+        if step.changed_use_cases is None:
+            use_case_cache.clear()
+        elif step.changed_use_cases:
+            invalidate_use_cases(step.changed_use_cases)
+
+        if step.done:
+            logger.info(f"Job {job_id} ({kind}) succeeded after {processed} items")
+        return not step.done
+
+    def _fail(self, job_id: uuid_pkg.UUID, error: str):
+        with self._session() as session:
+            now = datetime.utcnow()
+            session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.owner == INSTANCE_ID)
+                .values(status=JobStatus.failed, error=error, owner=None, lease_expires_at=None, updated_at=now, finished_at=now)
+            )
+            session.commit()
+
+    def _release(self, job_id: uuid_pkg.UUID):
+        with self._session() as session:
+            session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.owner == INSTANCE_ID, Job.status == JobStatus.running)
+                # a clean hand-over is not a failed attempt
+                .values(owner=None, lease_expires_at=None, attempts=Job.attempts - 1, updated_at=datetime.utcnow())
+            )
+            session.commit()
@@ -1,25 +1,51 @@
-from fastapi import FastAPI, HTTPException, Request, Depends, Body
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi import FastAPI, HTTPException, Request, Depends, Body, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.requests import ClientDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import delete
-from models import NodeDatasetInfo, UseCase, RemoveDatasetObject, SyntheticDatasetGenerationRequestStatus, DatasetMetadata, UpdateSdgTaskBody
+from models import Job, JobRequest, NodeDatasetInfo, NodeDatasetInfoBase, UseCase, RemoveDatasetObject, SyntheticDatasetGenerationRequestStatus, DatasetMetadata, UpdateSdgTaskBody
 from utils import save_dataset_info_to_database, update_use_case, get_dataset_info_from_database, remove_dataset_info_from_database, fetch_all_datasets, remove_all_datasets_from_database
+from utils import remove_datasets_from_database, fetch_tombstones_page
+from utils import save_dataset_batch_to_database, ingest_ndjson_stream
 from utils import register_new_sdg_task, update_sdg_task_status, get_sdg_task_status, get_sdg_task_uri, get_user_requests_list
-from utils import get_all_use_cases, get_single_use_case, delete_all_use_cases, delete_all_use_cases_and_datasets, remove_single_dataset_from_use_case
+from utils import get_all_use_cases, get_single_use_case, get_all_use_cases_versioned, get_single_use_case_versioned, get_use_case_version, get_use_cases_version, delete_all_use_cases, delete_all_use_cases_and_datasets, remove_single_dataset_from_use_case
 from database import create_db_and_tables, get_session, add_datasets_column_to_usecases, add_new_metadata_columns, migrate_usecase_datasets_to_jsonb, migrate_schema_and_metadata_columns #add_use_case_column, 
+from database import backfill_usecase_datasets, add_content_hash_and_node_path_key, add_soft_delete_column, add_pagination_index, add_path_index, add_metadata_search_indexes, add_fulltext_search_column, install_catalogue_stats_triggers
 from auth import UserClaims, require_authentication
+from ingest_queue import IngestQueue, IngestQueueFull
+from config import settings
+from cache import use_case_cache
+from serialization import FastJSONResponse, negotiated_response, wants_msgpack
+from cache_sync import CacheInvalidationListener
+from compression import CompressionMiddleware
+from jobs import JobRunner, job_status
+from compaction import TombstoneCompactor
+from utils import get_catalogue_stats, get_dataset_facets, parse_dataset_fields, get_datasets_by_paths, dataset_search_conditions, search_datasets_fulltext, fetch_datasets_page, get_use_cases_page, iter_datasets_ndjson, iter_use_cases_ndjson
 import uvicorn
 import logging
-from typing import Dict, Literal, Optional
+import uuid as uuid_pkg
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
 from sqlmodel import select
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
+ingest_queue = IngestQueue()
+cache_listener = CacheInvalidationListener()
+job_runner = JobRunner()
+tombstone_compactor = TombstoneCompactor()
+
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_level=settings.GZIP_COMPRESSION_LEVEL,
+        zstd_level=settings.ZSTD_COMPRESSION_LEVEL,
+    )
 '''
 app.add_middleware(
     CORSMiddleware,
@@ -36,7 +62,33 @@ def on_startup():
     add_datasets_column_to_usecases()
     migrate_usecase_datasets_to_jsonb()
     migrate_schema_and_metadata_columns()
+    add_content_hash_and_node_path_key()
+    # before add_pagination_index, whose partial index reads deleted_at
+    add_soft_delete_column()
+    add_pagination_index()
+    add_path_index()
+    add_metadata_search_indexes()
     create_db_and_tables()
+    add_fulltext_search_column()
+    install_catalogue_stats_triggers()
+    backfill_usecase_datasets()
+    if settings.ASYNC_INGEST_ENABLED:
+        ingest_queue.start()
+    if settings.CACHE_SYNC_ENABLED:
+        cache_listener.start()
+    # picks up the jobs left unfinished by a previous run
+    if settings.JOBS_ENABLED:
+        job_runner.start()
+    if settings.COMPACTION_ENABLED:
+        tombstone_compactor.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # flush datasets still waiting in the write-behind queue
+    ingest_queue.stop()
+    job_runner.stop()
+    tombstone_compactor.stop()
+    cache_listener.stop()
 
 #@app.post("/metadata", tags=["data-catalogue"])
 #async def save_dataset_info_to_database_endpoint(node_dataset: NodeDatasetInfo, session: Session = Depends(get_session)):
@@ -48,7 +100,7 @@ def on_startup():
 
 @app.post("/metadata", tags=["data-catalogue"])
 async def save_dataset_info_to_database_endpoint(
-    node_dataset: NodeDatasetInfo, 
+    node_dataset: NodeDatasetInfoBase, 
     session: Session = Depends(get_session),
     ##current_user: UserClaims = Depends(require_authentication)
 ):
@@ -57,12 +109,11 @@ async def save_dataset_info_to_database_endpoint(
         #logger.info(f"Saving dataset info to the database for node: {node_dataset.node}, disease: {node_dataset.disease}")
         logger.info(f"Saving metadata for node={node_dataset.node}, use_case={node_dataset.use_case}")
         
-        # Save per-dataset metadata
-        save_dataset_info_to_database(session, node_dataset)
-        
-        # Update the use-case aggregated structure
+        # Save per-dataset metadata and update the use-case in one transaction;
+        # unchanged re-announcements are skipped without writing
         #update_use_case(session, node_dataset.use_case, node_dataset.node)
-        update_use_case(session, use_case=node_dataset.use_case, node=node_dataset.node, path=node_dataset.path)
+        result = save_dataset_batch_to_database(session, [NodeDatasetInfo.convert_to_db_entry(node_dataset)])[0]
+        logger.info(f"Metadata for path={node_dataset.path} {result['status']}")
 
         return {"message": 'Metadata uploaded successfully'}
     
@@ -72,6 +123,109 @@ async def save_dataset_info_to_database_endpoint(
     except Exception as e:
         logger.exception("Unexpected error while saving dataset info to the database")
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@app.post("/metadata/batch", tags=["data-catalogue"])
+async def save_dataset_batch_to_database_endpoint(
+    node_datasets: List[NodeDatasetInfoBase],
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Saves a list of dataset metadata in a single transaction.
+
+    Args:
+        node_datasets (List[NodeDatasetInfoBase]): Datasets to register.
+
+    Returns:
+        Log message and one result per submitted dataset.
+    """
+    try:
+        logger.info(f"Saving metadata batch of {len(node_datasets)} datasets")
+        results = save_dataset_batch_to_database(session, [NodeDatasetInfo.convert_to_db_entry(node_dataset) for node_dataset in node_datasets])
+        return {"message": "Metadata batch uploaded successfully", "results": results}
+
+    except HTTPException as e:
+        logger.error(f"HTTPException occurred: {str(e)}")
+        raise e
+    except Exception as e:
+        logger.exception("Unexpected error while saving dataset batch to the database")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@app.post("/metadata/queue", status_code=202, tags=["data-catalogue"])
+async def queue_dataset_info_endpoint(
+    node_dataset: NodeDatasetInfoBase,
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Validates a dataset and queues it for a group commit (write-behind ingest).
+
+    Returns:
+        Receipt id to poll with GET /metadata/queue/{receipt_id}. Receipts
+        are kept in the memory of the replica that queued the dataset.
+    """
+    if not settings.ASYNC_INGEST_ENABLED:
+        raise HTTPException(status_code=404, detail="Asynchronous ingest is disabled")
+
+    try:
+        receipt_id = ingest_queue.submit(NodeDatasetInfo.convert_to_db_entry(node_dataset))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IngestQueueFull:
+        logger.warning("Write-behind ingest queue is full")
+        raise HTTPException(status_code=503, detail="Ingest queue is full, retry later", headers={"Retry-After": "1"})
+
+    return {"message": "Metadata queued", "receipt_id": receipt_id}
+
+
+@app.get("/metadata/queue/{receipt_id}", tags=["data-catalogue"])
+async def get_queued_dataset_status(
+    receipt_id: str,
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    receipt = ingest_queue.status(receipt_id)
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return receipt
+
+
+class RequestBodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for handlers that keep reading the request body while
+    they respond. Starlette's disconnect listener would consume the body
+    messages, so it is not started: request.stream() raises ClientDisconnect
+    itself, and a failed send is reported the same way.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+@app.post("/metadata/stream", tags=["data-catalogue"])
+async def stream_dataset_info_to_database_endpoint(
+    request: Request,
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Ingests a newline-delimited JSON body of NodeDatasetInfo records.
+
+    Records are committed in bounded chunks while the body is read; the
+    response streams one NDJSON acknowledgement per committed chunk and per
+    invalid line, so a client that is cut off can resume after the last
+    committed line it received.
+    """
+    logger.info("Streaming metadata ingest started")
+    return RequestBodyStreamingResponse(
+        ingest_ndjson_stream(session, request.stream()),
+        media_type="application/x-ndjson",
+    )
 '''
 @app.get("/usecases", tags=["data-catalogue"])
 async def get_use_cases(
@@ -108,46 +262,117 @@ async def get_use_cases(
     use_cases = get_all_use_cases(session)
     return {"use_cases": [uc.model_dump() for uc in use_cases]}
 '''
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+FIELDS_DESCRIPTION = "Comma-separated columns and dataset_metadata sub-paths to return, e.g. node,path,dataset_metadata.title"
+
+
+def wants_ndjson(request: Request) -> bool:
+    """Whether the client asked for a streamed NDJSON listing."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def make_etag(request: Request, kind: str, version: int) -> str:
+    """Strong ETag of a versioned resource, distinct per representation."""
+    representation = "-msgpack" if wants_msgpack(request) else ""
+    return f'"{kind}-{version}{representation}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match lists etag (weak comparison, as RFC 9110 requires)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
 @app.get("/usecases", tags=["data-catalogue"])
 async def get_use_cases(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
     session: Session = Depends(get_session),
     ##current_user: UserClaims = Depends(require_authentication)
 ):
-    statement = select(UseCase)
-    ucs = session.exec(statement).all()
+    """
+    Lists use-cases. With `limit` (and the `next_cursor` of the previous
+    page as `cursor`) the listing is paginated on use_case.
+    With `Accept: application/x-ndjson` the full listing is streamed
+    instead, one JSON object per line.
+    """
+    if wants_ndjson(request):
+        return StreamingResponse(iter_use_cases_ndjson(session), media_type=NDJSON_MEDIA_TYPE)
 
-    return {
-        "use_cases": [
-            {
-                "use_case": uc.use_case,
-                "datasets": uc.datasets   # ← IMPORTANT
-            }
-            for uc in ucs
-        ]
-    }
+    if limit is None and cursor is None:
+        # conditional requests are answered from the version alone
+        etag = make_etag(request, "use-cases", get_use_cases_version(session))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        version, use_cases = get_all_use_cases_versioned(session)
+        return negotiated_response(request, {"use_cases": use_cases}, headers={"ETag": make_etag(request, "use-cases", version)})
+
+    use_cases, next_cursor = get_use_cases_page(session, limit or settings.PAGE_SIZE_DEFAULT, cursor)
+    return negotiated_response(request, {"use_cases": use_cases, "next_cursor": next_cursor})
 
 
 @app.get("/usecases/{use_case}", tags=["data-catalogue"])
 async def get_use_case(
     use_case: str,
+    request: Request,
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Returns a use case with a strong ETag. If-None-Match is answered with
+    304 Not Modified from the use case version, without loading its datasets.
+    """
+    version = get_use_case_version(session, use_case)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Use case not found")
+    etag = make_etag(request, "use-case", version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    version, body = get_single_use_case_versioned(session, use_case)
+    return negotiated_response(request, body, headers={"ETag": make_etag(request, "use-case", version)})
+
+
+@app.get("/stats", tags=["data-catalogue"])
+def get_stats(
     session: Session = Depends(get_session),
     ##current_user: UserClaims = Depends(require_authentication)
 ):
-    record = get_single_use_case(session, use_case)
+    """
+    Number of datasets, total num_records and num_features distribution,
+    per use-case, per node and overall.
+    """
+    return get_catalogue_stats(session)
 
-    return {
-        "use_case": record.use_case,
-        "datasets": record.datasets
-    }
+
+@app.get("/cache/stats", tags=["data-catalogue"])
+def get_cache_stats(
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """Hit/miss counters of the in-process read caches."""
+    return {"use_cases": use_case_cache.stats()}
 
 
 @app.delete("/usecases/all", tags=["data-catalogue"])
 async def delete_all_usecases(
+    include_datasets: bool = Query(False, description="Also delete all dataset metadata, in the same transaction"),
     session: Session = Depends(get_session),
     ##current_user: UserClaims = Depends(require_authentication)
 ):
-    delete_all_use_cases(session)
-    return {"detail": "All use-cases have been deleted"}
+    if include_datasets:
+        deleted = delete_all_use_cases_and_datasets(session)
+        return {"detail": "All use-cases AND dataset metadata have been deleted", "deleted": deleted}
+    deleted = delete_all_use_cases(session)
+    return {"detail": "All use-cases have been deleted", "deleted": deleted}
 '''
 @app.delete("/usecases/all", tags=["data-catalogue"])
 def delete_all_usecases(
@@ -157,6 +382,110 @@ def delete_all_usecases(
     delete_all_use_cases_and_datasets(session)
     return {"detail": "All use-cases AND dataset metadata have been deleted"}
 '''
+def search_filters(
+    theme: Optional[str] = None,
+    keyword: Optional[str] = None,
+    language: Optional[str] = None,
+    spatial: Optional[str] = None,
+    accessRights: Optional[str] = None,
+    license: Optional[str] = None,
+    publisher: Optional[str] = Query(None, description="Publisher name"),
+    use_case: Optional[str] = None,
+    node: Optional[str] = None,
+) -> Dict[str, Optional[str]]:
+    """DCAT metadata filters shared by the search and facets endpoints."""
+    return {
+        "theme": theme,
+        "keyword": keyword,
+        "language": language,
+        "spatial": spatial,
+        "accessRights": accessRights,
+        "license": license,
+        "publisher": publisher,
+        "use_case": use_case,
+        "node": node,
+    }
+
+
+@app.get("/metadata/search", tags=["data-catalogue"])
+def search_datasets(
+    request: Request,
+    filters: Dict[str, Optional[str]] = Depends(search_filters),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Lists the datasets matching all the given DCAT metadata filters,
+    paginated like GET /metadata.
+    """
+    projection = parse_dataset_fields(fields)
+    conditions = dataset_search_conditions(session, filters)
+    datasets, next_cursor = fetch_datasets_page(session, limit, cursor, conditions, projection)
+    return negotiated_response(request, {"datasets": datasets, "next_cursor": next_cursor})
+
+@app.get("/metadata/facets", tags=["data-catalogue"])
+def get_facets(
+    filters: Dict[str, Optional[str]] = Depends(search_filters),
+    facet_limit: int = Query(100, ge=1, le=settings.PAGE_SIZE_MAX, description="Values returned per facet"),
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Dataset counts per node, use_case, theme, language, license and
+    accessRights value, for the datasets matching the search filters.
+    """
+    return {"facets": get_dataset_facets(session, filters, facet_limit)}
+
+@app.get("/metadata/fulltext", tags=["data-catalogue"])
+def fulltext_search_datasets(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Web-search style query, e.g. \"blood cancer\" -pediatric"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Ranks datasets by relevance of their title, keyword, description and
+    purpose to the query, with highlighted snippets.
+    """
+    results, next_offset = search_datasets_fulltext(session, q, limit, offset)
+    return negotiated_response(request, {"results": results, "next_offset": next_offset})
+
+@app.post("/metadata/lookup", tags=["data-catalogue"])
+def lookup_datasets(
+    request: Request,
+    paths: List[str] = Body(..., embed=True, min_length=1, max_length=settings.PAGE_SIZE_MAX),
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Resolves a list of paths in one query. Paths with no registered dataset
+    are reported in `missing`.
+    """
+    return negotiated_response(request, get_datasets_by_paths(session, paths))
+
+@app.get("/metadata/deleted", tags=["data-catalogue"])
+def list_deleted_datasets(
+    request: Request,
+    since: Optional[datetime] = Query(None, description="Only datasets deleted after this time (UTC)"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Lists deleted datasets (id, node, path, use_case, deleted_at) in
+    deletion order, so incremental consumers can apply removals. Deletions
+    are listed once TOMBSTONE_FEED_LAG_SECONDS old, by the database clock,
+    and kept for TOMBSTONE_RETENTION_SECONDS.
+    """
+    datasets, next_cursor = fetch_tombstones_page(session, limit, cursor, since)
+    return negotiated_response(request, {"datasets": datasets, "next_cursor": next_cursor})
+
 @app.get("/metadata/{disease}", tags=["data-catalogue"])
 async def retrieve_dataset_info(
     node: str, 
@@ -166,19 +495,42 @@ async def retrieve_dataset_info(
 ):
     try:
         dataset_info = get_dataset_info_from_database(session, node, disease)
-        return dataset_info.dict()
+        return dataset_info.model_dump()
     except HTTPException as e:
         raise e
 
 @app.get("/metadata", tags=["data-catalogue"])
 async def get_all_datasets(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     session: Session = Depends(get_session),
     ##current_user: UserClaims = Depends(require_authentication)
 ):
-    datasets = await fetch_all_datasets(session)
-    if not datasets:
+    """
+    Lists datasets. With `limit` (and the `next_cursor` of the previous
+    page as `cursor`) the listing is paginated on the dataset id.
+    With `Accept: application/x-ndjson` the full listing is streamed
+    instead, one JSON object per line.
+    """
+    projection = parse_dataset_fields(fields)
+    if wants_ndjson(request):
+        return StreamingResponse(
+            iter_datasets_ndjson(session, projection=projection),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
+    if limit is None and cursor is None:
+        datasets = await fetch_all_datasets(session, projection)
+        if not datasets:
+            raise HTTPException(status_code=404, detail="No datasets found")
+        return negotiated_response(request, {"datasets": datasets})
+
+    datasets, next_cursor = fetch_datasets_page(session, limit or settings.PAGE_SIZE_DEFAULT, cursor, projection=projection)
+    if not datasets and cursor is None:
         raise HTTPException(status_code=404, detail="No datasets found")
-    return {"datasets": datasets}
+    return negotiated_response(request, {"datasets": datasets, "next_cursor": next_cursor})
 '''
 @app.delete("/usecases/all")
 def delete_all_usecases(
@@ -242,28 +594,87 @@ def delete_all_usecases(
 
 @app.delete("/metadata", tags=["data-catalogue"])
 async def delete_dataset(
-    path: str,
+    path: Optional[str] = None,
+    node: Optional[str] = Query(None, description="Delete every dataset of this node"),
+    use_case: Optional[str] = Query(None, description="Delete every dataset of this use-case"),
+    background: bool = Query(False, description="Run a node/use_case delete as a background job (202)"),
     session: Session = Depends(get_session),
     ##current_user: UserClaims = Depends(require_authentication)
 ):
+    if path is not None and (node is not None or use_case is not None):
+        raise HTTPException(status_code=400, detail="Use either path or the node/use_case selectors")
+    if path is None and node is None and use_case is None:
+        raise HTTPException(status_code=400, detail="One of path, node or use_case is required")
+    if background:
+        if path is not None:
+            raise HTTPException(status_code=400, detail="Only node/use_case deletes run in the background")
+        return submit_job(session, "delete_datasets", {key: value for key, value in (("node", node), ("use_case", use_case)) if value is not None})
+
     try:
+        if path is None:
+            deleted = remove_datasets_from_database(session, node=node, use_case=use_case)
+            if not deleted["datasets"]:
+                raise HTTPException(status_code=404, detail="No datasets found")
+            return {"message": f"{deleted['datasets']} datasets deleted successfully.", "deleted": deleted}
+
         result = remove_dataset_info_from_database(session, path=path)
         if result:
             return {"message": f"Dataset '{path}' deleted successfully."}
 
         raise HTTPException(status_code=404, detail=f"Dataset '{path}' not found.")
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def submit_job(session: Session, kind: str, params: Dict) -> JSONResponse:
+    """Queue a background job; 202 with the job status and its location."""
+    if not settings.JOBS_ENABLED:
+        raise HTTPException(status_code=404, detail="Background jobs are disabled")
+    try:
+        job = job_runner.submit(session, kind, params)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown job kind '{kind}'")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return FastJSONResponse(job_status(job), status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+
+@app.post("/jobs", tags=["data-catalogue"], status_code=202)
+async def create_job(
+    job_request: JobRequest,
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    """
+    Run a long catalogue operation in the background: delete_datasets
+    (params node and/or use_case), rebuild_use_case_membership or
+    rebuild_catalogue_stats. Poll GET /jobs/{id} for its progress.
+    """
+    return submit_job(session, job_request.kind, job_request.params)
+
+
+@app.get("/jobs/{job_id}", tags=["data-catalogue"])
+async def get_job(
+    job_id: uuid_pkg.UUID,
+    session: Session = Depends(get_session),
+    ##current_user: UserClaims = Depends(require_authentication)
+):
+    job = session.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+
 @app.delete("/metadata/all", tags=["data-catalogue"])
 async def delete_all_datasets(
     session: Session = Depends(get_session),
     ##current_user: UserClaims = Depends(require_authentication)
 ):
     try:
-        remove_all_datasets_from_database(session)
-        return {"message": "All datasets deleted successfully."}
+        deleted = remove_all_datasets_from_database(session)
+        return {"message": "All datasets deleted successfully.", "deleted": deleted}
     except HTTPException as e:
         logger.error(f"HTTPException: {e.detail}")
         raise e
@@ -386,6 +797,7 @@ async def get_synthetic_data_generation_request(task_id: str,
 
 @app.get("/synthetic_data/user_generation_requests", tags=['data-catalogue'])
 async def get_synthetic_data_user_generation_requests(
+    request: Request,
     username: str,
     session: Session = Depends(get_session)
 ):
@@ -407,7 +819,7 @@ async def get_synthetic_data_user_generation_requests(
     
     payload = {"username": username, "requests_count": len(requests_list), "requests_data": requests_list}
 
-    return JSONResponse(content=jsonable_encoder(payload))
+    return negotiated_response(request, payload)
 
 
 
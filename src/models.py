@@ -4,7 +4,7 @@ import uuid as uuid_pkg
 from enum import Enum
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import Column, String, JSON as JSONType
+from sqlalchemy import BigInteger, Column, String, Index, JSON as JSONType, text
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from typing import Dict, Any, Literal
 from pydantic import field_serializer
@@ -63,7 +63,17 @@ class DatasetMetadata(BaseModel):
     distribution: Optional[Distribution] = None
 
 
-class NodeDatasetInfo(SQLModel, table=True, __tablename__="data_catalogue"):
+# dataset_metadata keys most search requests filter on, with their own btree
+# expression index next to the GIN index
+INDEXED_METADATA_FIELDS = ("theme", "language")
+
+
+class NodeDatasetInfoBase(SQLModel):
+    """
+    A dataset as announced by a node: the API model of POST /metadata.
+    Catalogue bookkeeping (content_hash, deleted_at) is only on the table
+    model and is neither accepted nor returned by the API.
+    """
     #id: str = Field(default=None, primary_key=True)
     #id: Optional[int] = Field(default=None, primary_key=True)
     id: Optional[uuid_pkg.UUID] = Field(default_factory=uuid_pkg.uuid4,
@@ -85,9 +95,61 @@ class NodeDatasetInfo(SQLModel, table=True, __tablename__="data_catalogue"):
     #)
 
     dataset_metadata: Optional[DatasetMetadata] = Field(
-        sa_column=Column(JSONType)
+        sa_column=Column(JSONType().with_variant(JSONB, "postgresql"))
     )
 
+
+class NodeDatasetInfo(NodeDatasetInfoBase, table=True, __tablename__="data_catalogue"):
+    # a dataset is identified by the node announcing it and its path
+    __table_args__ = (
+        Index("uq_nodedatasetinfo_node_path", "node", "path", unique=True),
+        # lookups by path alone, which the (node, path) key cannot serve
+        Index("ix_nodedatasetinfo_path", "path"),
+        # keyset pagination order of GET /metadata, over live datasets only
+        Index(
+            "ix_nodedatasetinfo_live_id",
+            "id",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # tombstones, in deletion order: GET /metadata/deleted and compaction
+        Index(
+            "ix_nodedatasetinfo_deleted_at_id",
+            "deleted_at",
+            "id",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+            sqlite_where=text("deleted_at IS NOT NULL"),
+        ),
+        # filters of GET /metadata/search
+        Index("ix_nodedatasetinfo_use_case", "use_case"),
+        Index(
+            "ix_nodedatasetinfo_dataset_metadata",
+            "dataset_metadata",
+            postgresql_using="gin",
+            postgresql_ops={"dataset_metadata": "jsonb_path_ops"},
+        ),
+        *(
+            Index(
+                f"ix_nodedatasetinfo_metadata_{field.lower()}",
+                text(f"(dataset_metadata ->> '{field}')"),
+                postgresql_where=text("deleted_at IS NULL"),
+                sqlite_where=text("deleted_at IS NULL"),
+            )
+            for field in INDEXED_METADATA_FIELDS
+        ),
+    )
+
+    # hash of the announced content, used to skip unchanged re-announcements
+    content_hash: Optional[str] = Field(default=None, exclude=True)
+
+    # set when the dataset is deleted; tombstones are purged by compaction.TombstoneCompactor
+    deleted_at: Optional[datetime] = Field(default=None, exclude=True)
+
+    @classmethod
+    def convert_to_db_entry(cls, info: NodeDatasetInfoBase) -> "NodeDatasetInfo":
+        """Construct the row for db from the announced dataset"""
+        return cls.model_validate(info.model_dump())
+
 #class UseCase(SQLModel, table=True):
 #    __tablename__ = "usecases"
 #
@@ -133,7 +195,7 @@ class UseCase(SQLModel, table=True):
     # dictionary mapping node → list of URLs
     datasets: Dict[str, List[str]] = Field(
         default_factory=dict,
-        sa_column=Column(JSONType, nullable=False)#Column(JSONB, nullable=False)
+        sa_column=Column(JSONType().with_variant(JSONB, "postgresql"), nullable=False)
     )
 
     #nodes: list[str] = Field(
@@ -142,6 +204,121 @@ class UseCase(SQLModel, table=True):
     #)
 
 
+class UseCaseVersion(SQLModel, table=True):
+    """
+    Version of a use-case, bumped by every write to it and used as its ETag.
+    Rows outlive their use-case so that a recreated use-case never reuses
+    an ETag already handed out.
+    """
+    __tablename__ = "usecase_versions"
+
+    use_case: str = Field(primary_key=True)
+    version: int = 0
+
+
+class CatalogueStats(SQLModel, table=True):
+    """
+    Rollup of the datasets announced by a node in a use-case.
+
+    Maintained on PostgreSQL by statement-level triggers on nodedatasetinfo
+    (see database.install_catalogue_stats_triggers), so it is updated in the
+    same transaction as every ingest and delete; rebuilt by
+    `catalogue_cli stats-rebuild`.
+    """
+    __tablename__ = "catalogue_stats"
+
+    use_case: str = Field(primary_key=True)
+    node: str = Field(primary_key=True)
+    datasets: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    num_records_sum: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    num_records_count: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    num_features_sum: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    num_features_sq_sum: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    num_features_count: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default="0"))
+
+
+# browsing facets counted in catalogue_facets, as SQL expressions on a dataset row
+CATALOGUE_FACETS = {
+    "node": "node",
+    "use_case": "use_case",
+    "theme": "dataset_metadata->>'theme'",
+    "language": "dataset_metadata->>'language'",
+    "license": "dataset_metadata->>'license'",
+    "accessRights": "dataset_metadata->>'accessRights'",
+}
+
+
+class CatalogueFacet(SQLModel, table=True):
+    """
+    Number of datasets per value of a browsing facet (node, use_case,
+    theme, ...) over the whole catalogue. Maintained on PostgreSQL by the
+    same triggers as CatalogueStats; datasets without a value are not counted.
+    """
+    __tablename__ = "catalogue_facets"
+
+    facet: str = Field(primary_key=True)
+    value: str = Field(primary_key=True)
+    datasets: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default="0"))
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class Job(SQLModel, table=True):
+    """
+    A long catalogue operation run in the background by jobs.JobRunner.
+
+    The handler's checkpoint is committed together with the work of each
+    batch, so a job taken over after a restart resumes where the last
+    committed batch ended. A runner owns a job while its lease is valid.
+    """
+    __tablename__ = "jobs"
+
+    id: uuid_pkg.UUID = Field(default_factory=uuid_pkg.uuid4, primary_key=True)
+    kind: str
+    params: Dict[str, Any] = Field(
+        default_factory=dict,
+        sa_column=Column(JSONType().with_variant(JSONB, "postgresql"), nullable=False),
+    )
+    status: JobStatus = Field(default=JobStatus.queued, index=True)
+    processed: int = Field(default=0)
+    total: Optional[int] = Field(default=None)
+    checkpoint: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSONType().with_variant(JSONB, "postgresql")))
+    result: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSONType().with_variant(JSONB, "postgresql")))
+    error: Optional[str] = Field(default=None)
+    attempts: int = Field(default=0)
+    owner: Optional[str] = Field(default=None)
+    lease_expires_at: Optional[datetime] = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = Field(default=None)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = Field(default=None)
+
+
+class JobRequest(BaseModel):
+    kind: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class UseCaseDataset(SQLModel, table=True):
+    """
+    One dataset registered in a use-case by a node.
+
+    Replaces the UseCase.datasets JSON document as the source of truth: the
+    node -> URLs map returned by the API is aggregated from these rows.
+    """
+    __tablename__ = "usecase_datasets"
+
+    use_case: str = Field(primary_key=True)
+    node: str = Field(primary_key=True)
+    # object-storage URL of the dataset, as listed in the use-case
+    dataset: str = Field(primary_key=True, index=True)
+
+
 
 class RemoveDatasetObject(BaseModel):
     node: str
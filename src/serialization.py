@@ -0,0 +1,81 @@
+import datetime
+import enum
+import uuid as uuid_pkg
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack responses are only offered when installed
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not serialize natively."""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _msgpack_default(value: Any) -> Any:
+    """Types msgpack does not serialize natively, encoded as in JSON responses."""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid_pkg.UUID):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    return _default(value)
+
+
+def dumps_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson, which serializes datetimes, UUIDs,
+    enums and dataclasses directly; used as the application default.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+class MessagePackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True, datetime=False)
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Whether the client accepts MessagePack and it is available."""
+    accept = request.headers.get("accept", "")
+    return msgpack is not None and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def negotiated_response(
+    request: Request,
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Render content as MessagePack or JSON depending on the Accept header.
+    The content is handed to the encoder as is, skipping FastAPI's
+    jsonable_encoder pass.
+    """
+    headers = {**(headers or {}), "Vary": "Accept"}
+    response_class = MessagePackResponse if wants_msgpack(request) else FastJSONResponse
+    return response_class(content, status_code=status_code, headers=headers)
@@ -1,16 +1,94 @@
-from models import NodeDatasetInfo
+import asyncio
+import json
+import os
+import time as time_module
+import uuid
+import zlib
+from datetime import datetime, timedelta
 
 import pytest
-from sqlmodel import SQLModel, Session, create_engine
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, inspect
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+from starlette.requests import ClientDisconnect, Request as StarletteRequest
+
+import catalogue_cli
+import database
+import ingest_queue
+from cache import INSTANCE_ID, TTLCache, use_case_cache, use_case_key
+from cache_sync import CacheInvalidationListener
+from compaction import purge_tombstones
+from compression import CompressionMiddleware, negotiate_encoding
+from database import get_session, rebuild_catalogue_stats
+from ingest_queue import IngestQueue
+from jobs import JobRunner
+from main import app
+from models import Job, JobStatus, NodeDatasetInfo, UseCase
+from serialization import negotiated_response
+from utils import (
+    LIVE_DATASET,
+    dataset_search_conditions,
+    dataset_url,
+    delete_all_use_cases,
+    delete_all_use_cases_and_datasets,
+    fetch_all_datasets,
+    fetch_datasets_page,
+    fetch_tombstones_page,
+    get_all_use_cases,
+    get_catalogue_stats,
+    get_dataset_facets,
+    get_datasets_by_paths,
+    get_single_use_case,
+    get_single_use_case_versioned,
+    get_use_case_version,
+    get_use_cases_page,
+    get_use_cases_version,
+    ingest_ndjson_stream,
+    iter_datasets_ndjson,
+    iter_use_cases_ndjson,
+    parse_dataset_fields,
+    rebuild_use_case_membership,
+    remove_all_datasets_from_database,
+    remove_dataset_info_from_database,
+    remove_datasets_from_database,
+    remove_single_dataset_from_use_case,
+    save_dataset_batch_to_database,
+    save_dataset_info_to_database,
+    search_datasets_fulltext,
+    update_use_case,
+    validate_dataset_info,
+)
 
 @pytest.fixture
 def session():
-    engine = create_engine("sqlite://", echo=False)
+    # one shared connection: work handed to the thread pool sees the same database
+    engine = create_engine("sqlite://", echo=False, connect_args={"check_same_thread": False}, poolclass=StaticPool)
     SQLModel.metadata.create_all(engine)
+    use_case_cache.clear()
 
     with Session(engine) as session:
         yield session
 
+@pytest.fixture
+def pg_session(monkeypatch):
+    # the catalogue triggers only exist on PostgreSQL; the database is emptied
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    engine = create_engine(url)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(database, "engine", engine)
+    database.install_catalogue_stats_triggers()
+    use_case_cache.clear()
+
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
 def test_node_dataset_creation():
     ds = NodeDatasetInfo(
         node="node1",
@@ -25,17 +103,13 @@ def test_node_dataset_creation():
     assert ds.node == "node1"
     assert ds.dataset_metadata["title"] == "t"
 
-from models import UseCase
-from utils import update_use_case
 
 def test_update_usecase_creates(session):
     update_use_case(session, "covid", "node1", "file.csv")
 
-    uc = session.get(UseCase, "covid")
-    assert "node1" in uc.datasets
+    uc = get_single_use_case(session, "covid")
+    assert "node1" in uc["datasets"]
 
-from models import NodeDatasetInfo
-from utils import save_dataset_info_to_database
 
 def test_save_metadata(session):
     ds = NodeDatasetInfo(
@@ -48,3 +122,747 @@ def test_save_metadata(session):
 
     result = session.get(NodeDatasetInfo, ds.id)
     assert result is not None
+
+
+def test_save_metadata_batch(session):
+    batch = [
+        NodeDatasetInfo(node="n1", path="a.csv", use_case="covid"),
+        NodeDatasetInfo(node="n1", path="b.csv", use_case="covid"),
+        NodeDatasetInfo(node="n2", path="c.csv", use_case="aml"),
+    ]
+
+    results = save_dataset_batch_to_database(session, batch)
+
+    assert [r["status"] for r in results] == ["created"] * 3
+    assert len(session.exec(select(NodeDatasetInfo)).all()) == 3
+    assert get_single_use_case(session, "covid")["datasets"] == {"n1": [dataset_url("a.csv"), dataset_url("b.csv")]}
+    assert get_single_use_case(session, "aml")["datasets"] == {"n2": [dataset_url("c.csv")]}
+
+
+def test_ingest_ndjson_stream_commits_in_chunks(session):
+    lines = [json.dumps({"node": "n1", "path": f"f{i}.csv", "use_case": "covid", "dataset_metadata": None}) for i in range(5)]
+    lines.insert(2, '{"node": "n1"}')
+    # a bad field type is rejected on its line instead of failing its chunk's INSERT
+    lines.insert(4, json.dumps({"node": "n1", "path": "bad.csv", "use_case": "covid", "dataset_metadata": None, "num_records": {"a": 1}}))
+    lines.append("x" * 300)
+    body = ("\n".join(lines)).encode()
+
+    async def chunks():
+        # split mid-line to exercise incremental parsing
+        yield body[:30]
+        yield body[30:]
+
+    async def collect():
+        return [json.loads(ack) async for ack in ingest_ndjson_stream(session, chunks(), chunk_rows=2, chunk_ms=60000, max_line_bytes=200)]
+
+    acks = asyncio.run(collect())
+
+    assert [a["status"] for a in acks] == ["committed", "invalid", "invalid", "committed", "invalid", "committed", "done"]
+    assert [acks[1]["line"], acks[2]["line"], acks[4]["line"]] == [3, 5, 8]
+    assert acks[-1]["last_committed_line"] == 8
+    assert len(session.exec(select(NodeDatasetInfo)).all()) == 5
+
+def test_ingest_ndjson_stream_reports_progress_on_disconnect(session):
+    lines = [json.dumps({"node": "n1", "path": f"f{i}.csv", "use_case": "covid", "dataset_metadata": None}) for i in range(3)]
+
+    async def chunks():
+        yield ("\n".join(lines[:2]) + "\n").encode()
+        yield lines[2].encode()  # never committed: the client goes away mid-chunk
+        raise ClientDisconnect()
+
+    async def collect():
+        return [json.loads(ack) async for ack in ingest_ndjson_stream(session, chunks(), chunk_rows=2, chunk_ms=60000)]
+
+    acks = asyncio.run(collect())
+
+    assert [a["status"] for a in acks] == ["committed", "error"]
+    assert acks[-1]["last_committed_line"] == 2
+    assert sorted(d.path for d in session.exec(select(NodeDatasetInfo))) == ["f0.csv", "f1.csv"]
+
+    app.dependency_overrides[get_session] = lambda: session
+    try:
+        body = "\n".join(lines) + "\n"
+        response = TestClient(app).post("/metadata/stream", content=body.encode())
+        acks = [json.loads(line) for line in response.iter_lines() if line]
+    finally:
+        app.dependency_overrides.clear()
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert acks[-1] == {"status": "done", "lines": 3, "last_committed_line": 3}
+
+
+def test_update_usecase_deduplicates(session):
+    update_use_case(session, "covid", "node1", "file.csv")
+    update_use_case(session, "covid", "node1", "file.csv")
+    update_use_case(session, "covid", "node2", "other.csv")
+
+    uc = get_single_use_case(session, "covid")
+    assert uc["datasets"] == {"node1": [dataset_url("file.csv")], "node2": [dataset_url("other.csv")]}
+
+
+def test_remove_single_dataset_prunes_empty_usecase(session):
+    update_use_case(session, "covid", "node1", "a.csv")
+    update_use_case(session, "covid", "node1", "b.csv")
+
+    assert remove_single_dataset_from_use_case(session, dataset_url("a.csv")) is True
+    assert get_single_use_case(session, "covid")["datasets"] == {"node1": [dataset_url("b.csv")]}
+
+    assert remove_single_dataset_from_use_case(session, dataset_url("b.csv")) is True
+    assert session.get(UseCase, "covid") is None
+    assert remove_single_dataset_from_use_case(session, dataset_url("b.csv")) is False
+
+def test_reannounced_dataset_is_not_duplicated(session):
+    ds = {"node": "n1", "path": "a.csv", "use_case": "covid", "num_records": 10, "dataset_metadata": {"title": "t"}}
+
+    assert save_dataset_batch_to_database(session, [NodeDatasetInfo(**ds)])[0]["status"] == "created"
+    assert save_dataset_batch_to_database(session, [NodeDatasetInfo(**ds)])[0]["status"] == "unchanged"
+    assert save_dataset_batch_to_database(session, [NodeDatasetInfo(**{**ds, "num_records": 11})])[0]["status"] == "updated"
+
+    rows = session.exec(select(NodeDatasetInfo)).all()
+    assert len(rows) == 1
+    assert rows[0].num_records == 11
+    assert get_single_use_case(session, "covid")["datasets"] == {"n1": [dataset_url("a.csv")]}
+
+
+def test_ingest_queue_group_commits_on_stop():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    ingest_queue = IngestQueue(max_size=10, batch_size=2, flush_interval_ms=50, engine=engine)
+
+    ingest_queue.start()
+    receipts = [ingest_queue.submit(NodeDatasetInfo(node="n1", path=f"f{i}.csv", use_case="covid")) for i in range(3)]
+    ingest_queue.stop()
+
+    assert [ingest_queue.status(r)["status"] for r in receipts] == ["created"] * 3
+    with Session(engine) as session:
+        assert len(session.exec(select(NodeDatasetInfo)).all()) == 3
+
+
+def test_ingest_queue_isolates_failing_datasets(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    write_behind = IngestQueue(max_size=10, batch_size=3, flush_interval_ms=50, engine=engine)
+
+    with pytest.raises(ValueError, match="num_records"):
+        write_behind.submit(NodeDatasetInfo(node="n1", path="x.csv", use_case="covid", num_records="many"))
+
+    def save(session, batch):
+        if any(node_dataset.path == "bad.csv" for node_dataset in batch):
+            raise HTTPException(status_code=500, detail="boom")
+        return save_dataset_batch_to_database(session, batch)
+
+    monkeypatch.setattr(ingest_queue, "save_dataset_batch_to_database", save)
+    # queued before the flusher starts, so the three land in one batch
+    receipts = [write_behind.submit(NodeDatasetInfo(node="n1", path=path, use_case="covid"))
+                for path in ("a.csv", "bad.csv", "b.csv")]
+    write_behind.start()
+    write_behind.stop()
+
+    assert [write_behind.status(r)["status"] for r in receipts] == ["created", "failed", "created"]
+    assert write_behind.status(receipts[1])["detail"] == "boom"
+
+
+def test_rebuild_use_case_membership(session):
+    session.add(NodeDatasetInfo(node="n1", path="a.csv", use_case="covid"))
+    session.add(NodeDatasetInfo(node="n1", path="b.csv", use_case="aml"))
+    session.commit()
+    update_use_case(session, "covid", "n1", "b.csv")  # stale: b.csv now belongs to aml
+    update_use_case(session, "ghost", "n9", "z.csv")  # stray: no dataset row at all
+
+    counts = rebuild_use_case_membership(session)
+    session.commit()
+
+    assert counts == {"added": 2, "removed": 2}
+    assert get_single_use_case(session, "covid")["datasets"] == {"n1": [dataset_url("a.csv")]}
+    assert get_single_use_case(session, "aml")["datasets"] == {"n1": [dataset_url("b.csv")]}
+    assert session.get(UseCase, "ghost") is None
+
+
+def test_dataset_api_hides_bookkeeping_fields(session):
+    app.dependency_overrides[get_session] = lambda: session
+    try:
+        client = TestClient(app)
+        response = client.post("/metadata", json={
+            "node": "n1", "path": "a.csv", "use_case": "covid", "dataset_metadata": {"title": "t"},
+            "content_hash": "forged", "deleted_at": "2020-01-01T00:00:00",
+        })
+        assert response.status_code == 200
+
+        dataset = session.exec(select(NodeDatasetInfo)).one()
+        assert dataset.deleted_at is None and dataset.content_hash != "forged"
+        listed = client.get("/metadata", params={"limit": 10}).json()["datasets"][0]
+        assert "content_hash" not in listed and "deleted_at" not in listed
+
+        schemas = client.get("/openapi.json").json()["components"]["schemas"]
+        assert not {"content_hash", "deleted_at"} & set(schemas["NodeDatasetInfoBase"]["properties"])
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_keyset_pagination(session):
+    for i in range(5):
+        update_use_case(session, f"uc{i}", "n1", f"f{i}.csv")
+    save_dataset_batch_to_database(session, [NodeDatasetInfo(node="n1", path=f"f{i}.csv", use_case="covid") for i in range(5)])
+
+    paths, cursor = [], None
+    while True:
+        page, cursor = fetch_datasets_page(session, 2, cursor)
+        paths += [d["path"] for d in page]
+        if cursor is None:
+            break
+        # a dataset re-announced mid-listing keeps its place in the order
+        save_dataset_batch_to_database(session, [
+            NodeDatasetInfo(node="n1", path=page[0]["path"], use_case="covid", num_records=len(paths)),
+        ])
+    assert sorted(paths) == [f"f{i}.csv" for i in range(5)]
+
+    page, cursor = get_use_cases_page(session, 3)
+    assert [uc["use_case"] for uc in page] == ["covid", "uc0", "uc1"]
+    page, cursor = get_use_cases_page(session, 3, cursor)
+    assert [uc["use_case"] for uc in page] == ["uc2", "uc3", "uc4"]
+    assert cursor is None
+
+
+def test_ndjson_listing(session):
+    save_dataset_batch_to_database(session, [NodeDatasetInfo(node="n1", path=f"f{i}.csv", use_case="covid") for i in range(3)])
+    update_use_case(session, "empty_uc", "n1", "f0.csv")
+
+    lines = list(iter_datasets_ndjson(session, batch_size=2))
+    assert sorted(json.loads(line)["path"] for line in lines) == ["f0.csv", "f1.csv", "f2.csv"]
+
+    use_cases = [json.loads(line) for line in iter_use_cases_ndjson(session, batch_size=2)]
+    assert [uc["use_case"] for uc in use_cases] == ["covid", "empty_uc"]
+    assert len(use_cases[0]["datasets"]["n1"]) == 3
+
+
+def test_search_datasets(session):
+    save_dataset_batch_to_database(session, [
+        NodeDatasetInfo(node="n1", path="a.csv", use_case="covid",
+                        dataset_metadata={"theme": "HEAL", "language": "it", "publisher": {"name": "UNIPI"}}),
+        NodeDatasetInfo(node="n1", path="b.csv", use_case="covid",
+                        dataset_metadata={"theme": "HEAL", "language": "en"}),
+        NodeDatasetInfo(node="n2", path="c.csv", use_case="mds",
+                        dataset_metadata={"theme": "HEAL", "language": "it"}),
+    ])
+
+    def search(**filters):
+        page, _ = fetch_datasets_page(session, 10, None, dataset_search_conditions(session, filters))
+        return sorted(d["path"] for d in page)
+
+    assert search(theme="HEAL", language="it") == ["a.csv", "c.csv"]
+    assert search(theme="HEAL", language="it", use_case="covid") == ["a.csv"]
+    assert search(publisher="UNIPI") == ["a.csv"]
+    assert search(language="fr") == []
+
+
+def test_search_datasets_postgresql(pg_session):
+    database.add_metadata_search_indexes()
+    save_dataset_batch_to_database(pg_session, [
+        NodeDatasetInfo(node="n1", path="a.csv", use_case="covid",
+                        dataset_metadata={"theme": "HEAL", "language": "it", "publisher": {"name": "UNIPI"}}),
+        NodeDatasetInfo(node="n1", path="b.csv", use_case="covid",
+                        dataset_metadata={"theme": ["HEAL"], "language": "en"}),
+    ])
+
+    def search(**filters):
+        page, _ = fetch_datasets_page(pg_session, 10, None, dataset_search_conditions(pg_session, filters))
+        return sorted(d["path"] for d in page)
+
+    assert search(theme="HEAL", language="it") == ["a.csv"]
+    assert search(theme="HEAL", publisher="UNIPI") == ["a.csv"]
+    assert search(language="en") == ["b.csv"]
+
+    indexes = {index["name"] for index in inspect(pg_session.get_bind()).get_indexes("nodedatasetinfo")}
+    assert {"ix_nodedatasetinfo_metadata_theme", "ix_nodedatasetinfo_metadata_language"} <= indexes
+
+
+def test_fulltext_search_requires_postgresql(session):
+    with pytest.raises(HTTPException) as excinfo:
+        search_datasets_fulltext(session, "heart", 10)
+    assert excinfo.value.status_code == 501
+
+
+def test_fulltext_search_pages(pg_session):
+    database.add_fulltext_search_column()
+    save_dataset_batch_to_database(pg_session, [
+        NodeDatasetInfo(node="n1", path="a.csv", use_case="cardio",
+                        dataset_metadata={"title": "Heart failure cohort"}),
+        NodeDatasetInfo(node="n1", path="b.csv", use_case="cardio",
+                        dataset_metadata={"title": "Cohort", "description": "patients with heart disease"}),
+        NodeDatasetInfo(node="n2", path="c.csv", use_case="cardio",
+                        dataset_metadata={"title": "Registry", "description": "heart surgery outcomes"}),
+        NodeDatasetInfo(node="n2", path="d.csv", use_case="onco",
+                        dataset_metadata={"title": "Tumour registry"}),
+    ])
+
+    first, next_offset = search_datasets_fulltext(pg_session, "heart", 2)
+    assert next_offset == 2
+    # a title match outranks description matches
+    assert first[0]["dataset"]["path"] == "a.csv"
+    assert first[0]["rank"] >= first[1]["rank"]
+    assert "<b>Heart</b>" in first[0]["snippet"]
+
+    second, next_offset = search_datasets_fulltext(pg_session, "heart", 2, offset=2)
+    assert next_offset is None
+    paths = [result["dataset"]["path"] for result in first + second]
+    assert sorted(paths) == ["a.csv", "b.csv", "c.csv"]
+
+    remove_dataset_info_from_database(pg_session, "a.csv")
+    assert search_datasets_fulltext(pg_session, "heart failure", 10) == ([], None)
+
+
+def test_lookup_datasets_by_paths(session):
+    save_dataset_batch_to_database(session, [NodeDatasetInfo(node="n1", path=f"f{i}.csv", use_case="covid") for i in range(3)])
+
+    result = get_datasets_by_paths(session, ["f2.csv", "f0.csv", "f2.csv", "nope.csv"])
+    assert sorted(d["path"] for d in result["datasets"]) == ["f0.csv", "f2.csv"]
+    assert result["missing"] == ["nope.csv"]
+
+
+def test_dataset_field_projection(session):
+    save_dataset_batch_to_database(session, [
+        NodeDatasetInfo(node="n1", path=f"f{i}.csv", use_case="covid", num_records=i,
+                        dataset_metadata={"title": f"T{i}", "publisher": {"name": "UNIPI"}})
+        for i in range(3)
+    ])
+    projection = parse_dataset_fields("path,num_records,dataset_metadata.title,dataset_metadata.publisher.name")
+    assert sorted(d["path"] for d in asyncio.run(fetch_all_datasets(session, parse_dataset_fields("path")))) == ["f0.csv", "f1.csv", "f2.csv"]
+
+    datasets = asyncio.run(fetch_all_datasets(session, projection))
+    assert sorted(datasets, key=lambda d: d["path"])[0] == {
+        "path": "f0.csv", "num_records": 0,
+        "dataset_metadata": {"title": "T0", "publisher": {"name": "UNIPI"}},
+    }
+
+    page, cursor = fetch_datasets_page(session, 2, projection=projection)
+    page2, cursor = fetch_datasets_page(session, 2, cursor, projection=projection)
+    assert sorted(d["path"] for d in page + page2) == ["f0.csv", "f1.csv", "f2.csv"]
+    assert cursor is None
+
+    with pytest.raises(HTTPException):
+        parse_dataset_fields("path,secret")
+    with pytest.raises(HTTPException):
+        parse_dataset_fields("path,content_hash")
+
+
+def test_use_case_cache_invalidation(session):
+    update_use_case(session, "covid", "n1", "a.csv")
+    hits = use_case_cache.hits
+
+    assert get_single_use_case(session, "covid")["datasets"] == {"n1": [dataset_url("a.csv")]}
+    assert get_single_use_case(session, "covid")["datasets"] == {"n1": [dataset_url("a.csv")]}
+    assert use_case_cache.hits == hits + 1
+
+    # writes drop the cached entries
+    update_use_case(session, "covid", "n1", "b.csv")
+    assert get_single_use_case(session, "covid")["datasets"] == {"n1": [dataset_url("a.csv"), dataset_url("b.csv")]}
+    assert len(get_all_use_cases(session)) == 1
+    remove_single_dataset_from_use_case(session, dataset_url("a.csv"))
+    assert get_all_use_cases(session)[0]["datasets"] == {"n1": [dataset_url("b.csv")]}
+
+def test_ttl_cache_bounds():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    for key in "abc":
+        cache.get_or_load(key, lambda: key.upper())
+    assert cache.stats()["entries"] == 2
+    assert cache.get_or_load("c", lambda: "fresh") == "C"
+    assert cache.get_or_load("a", lambda: "fresh") == "fresh"
+
+
+def test_cache_listener_evicts_remote_writes():
+    use_case_cache.clear()
+    for use_case in ("covid", "aml"):
+        use_case_cache.get_or_load(use_case_key(use_case), lambda: {"use_case": use_case})
+    listener = CacheInvalidationListener()
+
+    listener._handle(json.dumps({"origin": INSTANCE_ID, "use_cases": ["covid"]}))
+    assert use_case_cache.stats()["entries"] == 2
+
+    listener._handle(json.dumps({"origin": "other-replica", "use_cases": ["covid"]}))
+    assert use_case_cache.stats()["entries"] == 1
+
+    listener._handle(json.dumps({"origin": "other-replica", "use_cases": None}))
+    assert use_case_cache.stats()["entries"] == 0
+
+
+def test_use_case_versions(session):
+    update_use_case(session, "covid", "n1", "a.csv")
+    update_use_case(session, "aml", "n1", "b.csv")
+    version, _ = get_single_use_case_versioned(session, "covid")
+    listing_version = get_use_cases_version(session)
+
+    update_use_case(session, "covid", "n1", "c.csv")
+    assert get_use_case_version(session, "covid") == version + 1
+    assert get_use_case_version(session, "aml") == 1
+    assert get_use_cases_version(session) > listing_version
+
+    # versions survive the use-cases, so ETags are never reused
+    delete_all_use_cases(session)
+    update_use_case(session, "covid", "n1", "a.csv")
+    assert get_use_case_version(session, "covid") > version + 1
+
+
+def test_use_case_conditional_get(session):
+    update_use_case(session, "covid", "n1", "a.csv")
+    app.dependency_overrides[get_session] = lambda: session
+    try:
+        client = TestClient(app)
+        response = client.get("/usecases/covid")
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert client.get("/usecases/covid", headers={"If-None-Match": etag}).status_code == 304
+        assert client.get("/usecases/covid", headers={"If-None-Match": '"use-case-0"'}).status_code == 200
+
+        # a missing use-case is never "not modified", whatever the validator
+        for validator in ("*", '"use-case-0"', etag):
+            assert client.get("/usecases/nope", headers={"If-None-Match": validator}).status_code == 404
+        delete_all_use_cases(session)
+        assert client.get("/usecases/covid", headers={"If-None-Match": etag}).status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+def _exported_rows(engine):
+    with Session(engine) as session:
+        return {
+            table.name: sorted((tuple(row) for row in session.execute(select(table))), key=repr)
+            for table in catalogue_cli.EXPORT_TABLES if table.name != "usecase_versions"
+        }
+
+def test_export_restore_round_trip(session, tmp_path, monkeypatch):
+    save_dataset_batch_to_database(session, [
+        NodeDatasetInfo(node="n1", path="a.csv", use_case="covid", num_records=3, dataset_metadata={"title": "A"}),
+        NodeDatasetInfo(node="n1", path="b.csv", use_case="covid"),
+        NodeDatasetInfo(node="n2", path="c.csv", use_case="aml"),
+    ])
+    remove_dataset_info_from_database(session, "b.csv")
+    dump = str(tmp_path / "catalogue.ndjson.gz")
+    monkeypatch.setattr(database, "engine", session.get_bind())
+    counts = catalogue_cli.export(dump)
+    original = _exported_rows(session.get_bind())
+
+    restored = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(restored)
+    monkeypatch.setattr(database, "engine", restored)
+    assert catalogue_cli.restore(dump) == counts
+    assert _exported_rows(restored) == original
+
+    # --replace drops what the export does not contain; versions only move forward
+    with Session(restored) as other:
+        save_dataset_batch_to_database(other, [NodeDatasetInfo(node="n9", path="x.csv", use_case="extra")])
+        version = get_use_case_version(other, "covid")
+    catalogue_cli.restore(dump, replace=True)
+    assert _exported_rows(restored) == original
+    with Session(restored) as other:
+        assert get_use_case_version(other, "covid") > version
+        assert get_catalogue_stats(other)["total"]["datasets"] == 2
+
+def test_bulk_load_rows_match_api_ingest(session):
+    metadata = {"title": "t", "unknown": "dropped"}
+    save_dataset_batch_to_database(session, [
+        validate_dataset_info({"node": "n1", "path": "a.csv", "use_case": "covid", "num_records": 10, "dataset_metadata": metadata}),
+    ])
+    ingested = session.exec(select(NodeDatasetInfo)).one()
+
+    # CSV cells are strings; the row is built from the validated record
+    row = dict(zip(catalogue_cli.COPY_COLUMNS, catalogue_cli.to_copy_row(
+        {"node": "n1", "path": "a.csv", "use_case": "covid", "num_records": "10", "dataset_metadata": metadata}
+    )))
+    assert row["num_records"] == 10
+    assert row["content_hash"] == ingested.content_hash
+    assert "unknown" not in json.loads(row["dataset_metadata"])
+
+    rejected = []
+    rows = list(catalogue_cli.to_copy_rows([
+        {"node": "n1", "path": "b.csv", "use_case": "covid", "num_records": "many"},
+        {"node": "n1", "path": "c.csv", "use_case": "covid", "timestamp": "yesterday"},
+        {"node": "n1", "path": "d.csv", "use_case": "covid", "dataset_metadata": ["not", "a", "dict"]},
+        '{"truncated": ',
+        {"node": "n1", "path": "e.csv", "use_case": "covid"},
+    ], rejected))
+    assert rejected == [1, 2, 3, 4]
+    assert [dict(zip(catalogue_cli.COPY_COLUMNS, row))["path"] for row in rows] == ["e.csv"]
+
+
+def test_catalogue_stats(session):
+    save_dataset_batch_to_database(session, [
+        NodeDatasetInfo(node="n1", path="a.csv", use_case="covid", num_records=10, num_features=2),
+        NodeDatasetInfo(node="n1", path="b.csv", use_case="covid", num_records=5, num_features=4),
+        NodeDatasetInfo(node="n2", path="c.csv", use_case="aml", num_records=7),
+    ])
+    rebuild_catalogue_stats(session.connection())
+
+    stats = get_catalogue_stats(session)
+    assert stats["total"]["datasets"] == 3
+    assert stats["total"]["num_records"] == {"total": 22, "reported": 3}
+    assert stats["total"]["num_features"] == {"reported": 2, "mean": 3.0, "stddev": 1.0}
+    assert [(uc["use_case"], uc["datasets"]) for uc in stats["use_cases"]] == [("aml", 1), ("covid", 2)]
+    assert [node["node"] for node in stats["nodes"]] == ["n1", "n2"]
+
+
+def test_catalogue_stats_triggers(pg_session):
+    def counts():
+        stats = get_catalogue_stats(pg_session)
+        themes = get_dataset_facets(pg_session, {}, facet_limit=10)["theme"]
+        return (
+            {use_case["use_case"]: use_case["datasets"] for use_case in stats["use_cases"]},
+            stats["total"]["num_records"]["total"],
+            {facet["value"]: facet["count"] for facet in themes},
+        )
+
+    save_dataset_batch_to_database(pg_session, [
+        NodeDatasetInfo(node="n1", path="a.csv", use_case="covid", num_records=10, dataset_metadata={"theme": "HEAL"}),
+        NodeDatasetInfo(node="n1", path="b.csv", use_case="covid", num_records=5, dataset_metadata={"theme": "HEAL"}),
+        NodeDatasetInfo(node="n2", path="c.csv", use_case="aml", dataset_metadata={"theme": "TECH"}),
+    ])
+    assert counts() == ({"aml": 1, "covid": 2}, 15, {"HEAL": 2, "TECH": 1})
+
+    # an update moves the dataset between groups and facet values
+    save_dataset_batch_to_database(pg_session, [
+        NodeDatasetInfo(node="n1", path="b.csv", use_case="aml", num_records=7, dataset_metadata={"theme": "TECH"}),
+    ])
+    assert counts() == ({"aml": 2, "covid": 1}, 17, {"HEAL": 1, "TECH": 2})
+
+    remove_dataset_info_from_database(pg_session, "a.csv")
+    assert counts() == ({"aml": 2}, 7, {"TECH": 2})
+
+    # purging a tombstone changes nothing, deleting a live row subtracts it
+    assert purge_tombstones(pg_session, 0, 10) == 1
+    assert counts() == ({"aml": 2}, 7, {"TECH": 2})
+    pg_session.exec(delete(NodeDatasetInfo).where(NodeDatasetInfo.path == "c.csv"))
+    pg_session.commit()
+    assert counts() == ({"aml": 1}, 7, {"TECH": 1})
+
+def test_dataset_facets(session):
+    save_dataset_batch_to_database(session, [
+        NodeDatasetInfo(node="n1", path="a.csv", use_case="covid", dataset_metadata={"theme": "HEAL", "language": "it"}),
+        NodeDatasetInfo(node="n1", path="b.csv", use_case="covid", dataset_metadata={"theme": "HEAL", "language": "en"}),
+        NodeDatasetInfo(node="n2", path="c.csv", use_case="aml", dataset_metadata={"theme": "TECH"}),
+    ])
+
+    facets = get_dataset_facets(session, {}, facet_limit=10)
+    assert facets["theme"] == [{"value": "HEAL", "count": 2}, {"value": "TECH", "count": 1}]
+    assert facets["node"] == [{"value": "n1", "count": 2}, {"value": "n2", "count": 1}]
+    assert facets["license"] == []
+
+    facets = get_dataset_facets(session, {"theme": "HEAL"}, facet_limit=1)
+    assert facets["language"] == [{"value": "en", "count": 1}]
+    assert facets["use_case"] == [{"value": "covid", "count": 2}]
+
+
+def _request(accept):
+    return StarletteRequest({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+def test_negotiated_response():
+    content = {"id": uuid.UUID(int=1), "timestamp": datetime(2024, 1, 2, 3, 4, 5), "n": 1}
+
+    response = negotiated_response(_request("application/json"), content)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {"id": str(uuid.UUID(int=1)), "timestamp": "2024-01-02T03:04:05", "n": 1}
+
+    # MessagePack is optional: the code only offers it when installed
+    msgpack = pytest.importorskip("msgpack")
+    response = negotiated_response(_request("application/msgpack"), content)
+    assert response.media_type == "application/msgpack"
+    assert msgpack.unpackb(response.body) == json.loads(negotiated_response(_request(""), content).body)
+    assert response.headers["vary"] == "Accept"
+
+
+def test_negotiate_encoding():
+    pytest.importorskip("zstandard")
+    assert negotiate_encoding("gzip, zstd") == "zstd"
+    assert negotiate_encoding("gzip;q=1.0, zstd;q=0.5") == "gzip"
+    assert negotiate_encoding("zstd;q=0, *") == "gzip"
+    assert negotiate_encoding("br") is None
+    assert negotiate_encoding("") is None
+
+def test_compression_middleware():
+    zstandard = pytest.importorskip("zstandard")
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("x" * 10)
+
+    @app.get("/large")
+    def large():
+        return PlainTextResponse("x" * 1000, headers={"ETag": '"v1"'})
+
+    @app.get("/unchanged")
+    def unchanged():
+        return Response(status_code=304, headers={"ETag": '"v1"'})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((f"{i}\n" for i in range(3)), media_type="application/x-ndjson")
+
+    chunks = []
+    async def capture(app, path, accept_encoding):
+        requests = [{"type": "http.request", "body": b"", "more_body": False}]
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.Event().wait()
+        async def send(message):
+            chunks.append(message)
+        scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [(b"accept-encoding", accept_encoding)]}
+        await app(scope, receive, send)
+
+    client = TestClient(app)
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert response.text == "x" * 1000
+    # the 304 carries the validator of the compressed 200
+    assert client.get("/unchanged", headers={"Accept-Encoding": "gzip"}).headers["etag"] == 'W/"v1"'
+    assert client.get("/unchanged", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"v1"'
+
+    asyncio.run(capture(app, "/large", b"zstd"))
+    start, body = chunks
+    assert (b"content-encoding", b"zstd") in start["headers"]
+    assert zstandard.ZstdDecompressor().decompress(body["body"]) == b"x" * 1000
+
+    # every streamed chunk decodes on its own, before the stream ends
+    chunks.clear()
+    asyncio.run(capture(app, "/stream", b"gzip"))
+    decoder = zlib.decompressobj(31)
+    lines = [decoder.decompress(message["body"]) for message in chunks[1:]]
+    assert lines[:3] == [b"0\n", b"1\n", b"2\n"]
+    assert decoder.eof
+
+
+def test_bulk_deletes_report_counts(session):
+    save_dataset_batch_to_database(session, [
+        NodeDatasetInfo(node="n1", path=f"d{i}.csv", use_case="covid" if i % 2 else "aml") for i in range(4)
+    ])
+
+    assert remove_all_datasets_from_database(session) == {"datasets": 4}
+    assert session.exec(select(NodeDatasetInfo).where(LIVE_DATASET)).all() == []
+    assert len(get_all_use_cases(session)) == 2
+
+    save_dataset_batch_to_database(session, [NodeDatasetInfo(node="n1", path="e.csv", use_case="covid")])
+    assert delete_all_use_cases_and_datasets(session) == {"datasets": 1, "use_cases": 2, "memberships": 5}
+    assert session.exec(select(NodeDatasetInfo).where(LIVE_DATASET)).all() == []
+    assert get_all_use_cases(session) == []
+
+
+def test_remove_datasets_by_node_or_use_case(session):
+    save_dataset_batch_to_database(session, [
+        NodeDatasetInfo(node=node, path=f"{node}/d{i}.csv", use_case=use_case)
+        for node in ("n1", "n2") for i, use_case in enumerate(("covid", "covid", "aml"))
+    ])
+
+    assert remove_datasets_from_database(session, node="n1", use_case="covid") == {"datasets": 2, "memberships": 2}
+    assert get_single_use_case(session, "covid")["datasets"] == {"n2": [dataset_url("n2/d0.csv"), dataset_url("n2/d1.csv")]}
+
+    assert remove_datasets_from_database(session, node="n2") == {"datasets": 3, "memberships": 3}
+    with pytest.raises(HTTPException):
+        get_single_use_case(session, "covid")
+    assert get_single_use_case(session, "aml")["datasets"] == {"n1": [dataset_url("n1/d2.csv")]}
+
+    assert remove_datasets_from_database(session, use_case="retired") == {"datasets": 0, "memberships": 0}
+
+
+def _wait_for_job(engine, job_id, timeout=5):
+    deadline = time_module.monotonic() + timeout
+    while time_module.monotonic() < deadline:
+        with Session(engine) as session:
+            job = session.get(Job, job_id)
+            if job.status in (JobStatus.succeeded, JobStatus.failed):
+                return job
+        time_module.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+def test_job_runner_deletes_in_batches_and_resumes(tmp_path):
+    # a file database: the poller, the workers and the test use their own connections
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        save_dataset_batch_to_database(session, [
+            NodeDatasetInfo(node=node, path=f"{node}/d{i}.csv", use_case="covid") for node in ("n1", "n2") for i in range(5)
+        ])
+        with pytest.raises(ValueError):
+            JobRunner(engine=engine).submit(session, "delete_datasets", {})
+
+        # a job left running by a runner that died: its lease has expired
+        orphan = Job(kind="delete_datasets", params={"node": "n2"}, status=JobStatus.running,
+                     owner="dead", lease_expires_at=datetime.utcnow() - timedelta(seconds=1),
+                     processed=0, checkpoint={"datasets": 0, "memberships": 0})
+        session.add(orphan)
+        session.commit()
+        orphan_id = orphan.id
+
+        runner = JobRunner(workers=2, batch_rows=2, poll_seconds=0.05, engine=engine)
+        runner.start()
+        job = runner.submit(session, "delete_datasets", {"node": "n1"})
+        finished = _wait_for_job(engine, job.id)
+        resumed = _wait_for_job(engine, orphan_id)
+        runner.stop()
+
+    assert finished.status == JobStatus.succeeded
+    assert (finished.processed, finished.total) == (5, 5)
+    assert finished.result == {"datasets": 5, "memberships": 5}
+    assert resumed.status == JobStatus.succeeded and resumed.attempts == 1
+    with Session(engine) as session:
+        assert session.exec(select(NodeDatasetInfo).where(LIVE_DATASET)).all() == []
+
+
+def test_job_runner_fails_jobs_that_keep_crashing(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    with Session(engine) as session:
+        save_dataset_batch_to_database(session, [NodeDatasetInfo(node="n1", path="d.csv", use_case="covid")])
+        # both left running by a dead runner; one has used up its attempts
+        retried = Job(kind="delete_datasets", params={"node": "n1"}, status=JobStatus.running,
+                      owner="dead", lease_expires_at=expired, attempts=1)
+        exhausted = Job(kind="delete_datasets", params={"node": "n1"}, status=JobStatus.running,
+                        owner="dead", lease_expires_at=expired, attempts=2)
+        session.add_all([retried, exhausted])
+        session.commit()
+        retried_id, exhausted_id = retried.id, exhausted.id
+
+    runner = JobRunner(workers=1, poll_seconds=0.05, max_attempts=2, engine=engine)
+    runner.start()
+    retried = _wait_for_job(engine, retried_id)
+    exhausted = _wait_for_job(engine, exhausted_id)
+    runner.stop()
+
+    assert retried.status == JobStatus.succeeded and retried.attempts == 2
+    assert exhausted.status == JobStatus.failed and exhausted.attempts == 2
+    assert "Gave up after 2 attempts" in exhausted.error and exhausted.owner is None
+
+
+def test_soft_delete_tombstones_revival_and_compaction(session):
+    save_dataset_batch_to_database(session, [NodeDatasetInfo(node="n1", path=f"d{i}.csv", use_case="covid") for i in range(3)])
+    dataset_id = get_datasets_by_paths(session, ["d0.csv"])["datasets"][0]["id"]
+
+    assert remove_dataset_info_from_database(session, "d0.csv")
+    time_module.sleep(0.01)  # the SQLite clock has millisecond resolution
+    assert remove_datasets_from_database(session, node="n1") == {"datasets": 2, "memberships": 2}
+    assert get_datasets_by_paths(session, ["d0.csv"])["missing"] == ["d0.csv"]
+    assert fetch_datasets_page(session, 10)[0] == []
+
+    # removals are visible to incremental consumers, in deletion order,
+    # once they are older than the feed lag
+    assert fetch_tombstones_page(session, 10) == ([], None)
+    page, next_cursor = fetch_tombstones_page(session, 2, lag_seconds=0)
+    rest, _ = fetch_tombstones_page(session, 2, next_cursor, lag_seconds=0)
+    assert page[0]["path"] == "d0.csv"
+    assert isinstance(page[0]["deleted_at"], datetime)
+    assert sorted(row["path"] for row in page + rest) == ["d0.csv", "d1.csv", "d2.csv"]
+    assert fetch_tombstones_page(session, 10, since=page[0]["deleted_at"], lag_seconds=0)[0] == page[1:] + rest
+
+    # announcing a deleted dataset again revives it under its old id
+    results = save_dataset_batch_to_database(session, [NodeDatasetInfo(node="n1", path="d0.csv", use_case="covid")])
+    assert (results[0]["status"], results[0]["id"]) == ("created", str(dataset_id))
+    assert get_single_use_case(session, "covid")["datasets"] == {"n1": [dataset_url("d0.csv")]}
+
+    assert purge_tombstones(session, 3600, 10) == 0
+    time_module.sleep(0.01)
+    assert purge_tombstones(session, 0, 1) == 1
+    assert purge_tombstones(session, 0, 10) == 1
+    assert [row.path for row in session.exec(select(NodeDatasetInfo))] == ["d0.csv"]
@@ -1,16 +1,56 @@
 from sqlmodel import Session, select
 from sqlalchemy.orm import Session
+from sqlalchemy import String, any_, case, cast, delete, func, insert, literal, literal_column, or_, text, tuple_, type_coerce, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, REGCONFIG, TSVECTOR
+from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
-from models import NodeDatasetInfo, UseCase, SyntheticDatasetGenerationRequestStatus, SyntheticDatasetGenerationRequestStatusTable as SDGRT
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, ValidationError
+from models import CATALOGUE_FACETS, INDEXED_METADATA_FIELDS, NodeDatasetInfo, NodeDatasetInfoBase, CatalogueFacet, CatalogueStats, UseCase, UseCaseDataset, UseCaseVersion, SyntheticDatasetGenerationRequestStatus, SyntheticDatasetGenerationRequestStatusTable as SDGRT
+import base64
+import hashlib
+import json
 import logging
-from typing import Tuple, Literal, Optional, List, Dict, Any
+import math
+import time
+from typing import Tuple, Literal, Optional, List, Dict, Any, AsyncIterator, Iterable, Iterator
 from enum import Enum
+from datetime import datetime, timedelta, timezone
+import uuid as uuid_pkg
 
-from config import Settings
+from config import Settings, settings
+from serialization import dumps_json
+from cache import INSTANCE_ID, USE_CASE_LISTING_KEY, invalidate_use_cases, use_case_cache, use_case_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Object storage endpoint used to build the dataset URLs listed in UseCase.datasets
+MINIO_ENDPOINT = "obstorageapi.k8s.synthema.rid-intrasoft.eu"
+
+# datasets not tombstoned by a delete; spelled like the partial indexes' predicate
+LIVE_DATASET = NodeDatasetInfo.deleted_at.is_(None)
+
+
+def database_utc_now(session: Session, seconds_ago: float = 0) -> Any:
+    """
+    Naive UTC time of the database clock, optionally moved back, as a SQL
+    expression. Tombstones are stamped with it so that every replica writes
+    them from the same clock.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        # clock_timestamp() keeps advancing inside a transaction, unlike now()
+        return func.timezone("UTC", func.clock_timestamp()) - timedelta(seconds=seconds_ago)
+    # the text layout SQLAlchemy stores SQLite datetimes in, so values compare
+    return func.strftime("%Y-%m-%d %H:%M:%f000", "now", f"-{seconds_ago} seconds")
+
+
+def dataset_url(path: str) -> str:
+    """Return the object-storage URL registered in a use-case for a dataset path."""
+    return f"{MINIO_ENDPOINT}/{path}"
+
 #def save_dataset_info_to_database(session: Session, node_dataset: NodeDatasetInfo):
 #    try:
 #        session.add(node_dataset)
@@ -20,13 +60,16 @@ logger = logging.getLogger(__name__)
 #        raise HTTPException(status_code=500, detail="Internal Server Error")
 
 def save_dataset_info_to_database(
-    session: Session, 
+    session: Session,
     node_dataset: NodeDatasetInfo
 ):
+    """Save (or refresh) the metadata of one dataset, keyed on (node, path)."""
     try:
         #logger.info(f"Adding dataset info for node: {node_dataset.node}, disease: {node_dataset.disease}")
         logger.info(f"Adding dataset info for node={node_dataset.node}, use_case={node_dataset.use_case}")
-        session.add(node_dataset)
+        row = _dataset_row(node_dataset)
+        row["content_hash"] = compute_content_hash(node_dataset)
+        _upsert_dataset_rows(session, [row])
         session.commit()
         logger.info(f"Dataset info saved successfully for node: {node_dataset.node}")
     except Exception as e:
@@ -190,31 +233,516 @@ def update_use_case(session, use_case: str, node: str, path: str):
 
     session.commit()
 
-def update_use_case(session, use_case: str, node: str, path: str):
-    record = session.get(UseCase, use_case)
+def _insert(session: Session, model):
+    """Dialect-specific INSERT for `model`, supporting ON CONFLICT clauses."""
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
 
-    # Construct URL from MINIO endpoint
-    minio_url = f"obstorageapi.k8s.synthema.rid-intrasoft.eu/{path}"
 
-    if record:
-        # ensure full copy so SQLAlchemy detects mutation
-        data = dict(record.datasets or {})
+def upsert_use_case_datasets(session: Session, use_case: str, additions: Dict[str, List[str]]):
+    """
+    Add dataset URLs (node -> list of URLs) to a use-case without committing.
 
-        # always append blindly
-        node_list = list(data.get(node, []))
-        node_list.append(minio_url)
+    Each URL is one usecase_datasets row, inserted with ON CONFLICT DO NOTHING,
+    so the cost does not depend on how many datasets the use-case already has
+    and concurrent writers cannot lose each other's updates.
+    """
+    session.exec(
+        _insert(session, UseCase)
+        .values(use_case=use_case, datasets={})
+        .on_conflict_do_nothing(index_elements=["use_case"])
+    )
 
-        data[node] = node_list
-        record.datasets = data  # reassign to trigger update
+    rows = [
+        {"use_case": use_case, "node": node, "dataset": url}
+        for node, urls in additions.items()
+        for url in urls
+    ]
+    if rows:
+        session.exec(
+            _insert(session, UseCaseDataset).values(rows).on_conflict_do_nothing()
+        )
 
-    else:
-        record = UseCase(
-            use_case=use_case,
-            datasets={node: [minio_url]}
+
+def _prune_empty_use_cases(session: Session, use_cases: List[str]):
+    """Delete the given use-cases once they have no datasets left."""
+    if not use_cases:
+        return
+
+    has_datasets = select(UseCaseDataset.use_case).where(UseCaseDataset.use_case == UseCase.use_case)
+    session.exec(
+        delete(UseCase).where(UseCase.use_case.in_(use_cases), ~has_datasets.exists())
+    )
+
+
+def mark_use_cases_changed(session: Session, use_cases: Optional[Iterable[str]] = None):
+    """
+    Record a write to the given use-cases (to all of them when None) inside
+    the write transaction: their versions are bumped and the other replicas
+    are told to drop their cached reads.
+    """
+    if use_cases is not None:
+        use_cases = sorted(set(use_cases))
+    bump_use_case_versions(session, use_cases)
+    notify_use_cases_changed(session, use_cases)
+
+
+def bump_use_case_versions(session: Session, use_cases: Optional[List[str]] = None):
+    """
+    Increment the versions of the given use-cases, or of every known
+    use-case when None, without committing.
+    """
+    if use_cases is None:
+        session.exec(update(UseCaseVersion).values(version=UseCaseVersion.version + 1))
+        has_version = select(UseCaseVersion.use_case).where(UseCaseVersion.use_case == UseCase.use_case)
+        session.exec(
+            insert(UseCaseVersion).from_select(
+                ["use_case", "version"],
+                select(UseCase.use_case, literal(1)).where(~has_version.exists()),
+            )
         )
-        session.add(record)
+        return
 
-    session.commit()
+    if use_cases:
+        statement = _insert(session, UseCaseVersion).values(
+            [{"use_case": use_case, "version": 1} for use_case in use_cases]
+        )
+        session.exec(
+            statement.on_conflict_do_update(
+                index_elements=["use_case"],
+                set_={"version": UseCaseVersion.version + 1},
+            )
+        )
+
+
+def get_use_case_version(session: Session, use_case: str) -> Optional[int]:
+    """
+    Current version of a use-case, from the read cache when possible, or
+    None if the use-case does not exist: versions outlive their use-case.
+    """
+    cached = use_case_cache.peek(use_case_key(use_case))
+    if cached is not None:
+        return cached[0]
+    version = select(UseCaseVersion.version).where(UseCaseVersion.use_case == use_case).scalar_subquery()
+    statement = select(func.coalesce(version, 0)).where(
+        select(UseCase.use_case).where(UseCase.use_case == use_case).exists()
+    )
+    return session.exec(statement).first()
+
+
+def get_use_cases_version(session: Session) -> int:
+    """
+    Version of the use-case listing. Every write bumps at least one use-case
+    version and versions never decrease, so their sum changes on every write
+    without a single row that all writers would contend on.
+    """
+    cached = use_case_cache.peek(USE_CASE_LISTING_KEY)
+    if cached is not None:
+        return cached[0]
+    return session.exec(select(func.coalesce(func.sum(UseCaseVersion.version), 0))).one()
+
+
+def notify_use_cases_changed(session: Session, use_cases: Optional[Iterable[str]] = None):
+    """
+    Tell the other replicas to drop their cached reads of the given
+    use-cases (of all of them when None) through a PostgreSQL NOTIFY.
+    Must be called inside the write transaction: the notification is only
+    delivered if and when it commits.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return
+
+    payload = json.dumps({"origin": INSTANCE_ID, "use_cases": sorted(set(use_cases)) if use_cases is not None else None})
+    if len(payload.encode()) > MAX_NOTIFY_PAYLOAD_BYTES:
+        payload = json.dumps({"origin": INSTANCE_ID, "use_cases": None})
+    session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": settings.CACHE_NOTIFY_CHANNEL, "payload": payload},
+    )
+
+
+def rebuild_use_case_membership(session: Session) -> Dict[str, int]:
+    """
+    Rebuild usecase_datasets from the dataset rows with set-based statements,
+    without committing: every catalogued dataset is registered in its
+    use-case, memberships without a live dataset row behind them (moved to
+    another use-case, deleted, or never catalogued) are dropped and
+    use-cases left without datasets are deleted.
+
+    Returns:
+        Number of memberships added and removed.
+    """
+    url = literal(f"{MINIO_ENDPOINT}/") + NodeDatasetInfo.path
+    datasets_type = UseCase.__table__.c.datasets.type
+
+    removed = session.exec(
+        delete(UseCaseDataset).where(
+            ~select(NodeDatasetInfo.id).where(
+                NodeDatasetInfo.node == UseCaseDataset.node,
+                url == UseCaseDataset.dataset,
+                NodeDatasetInfo.use_case == UseCaseDataset.use_case,
+                LIVE_DATASET,
+            ).exists()
+        )
+    ).rowcount
+
+    session.exec(
+        insert(UseCase).from_select(
+            ["use_case", "datasets"],
+            select(NodeDatasetInfo.use_case, cast(literal({}, datasets_type), datasets_type))
+            .where(LIVE_DATASET, ~select(UseCase.use_case).where(UseCase.use_case == NodeDatasetInfo.use_case).exists())
+            .distinct(),
+        )
+    )
+
+    added = session.exec(
+        insert(UseCaseDataset).from_select(
+            ["use_case", "node", "dataset"],
+            select(NodeDatasetInfo.use_case, NodeDatasetInfo.node, url)
+            .where(
+                LIVE_DATASET,
+                ~select(UseCaseDataset.use_case).where(
+                    UseCaseDataset.use_case == NodeDatasetInfo.use_case,
+                    UseCaseDataset.node == NodeDatasetInfo.node,
+                    UseCaseDataset.dataset == url,
+                ).exists()
+            )
+            .distinct(),
+        )
+    ).rowcount
+
+    has_datasets = select(UseCaseDataset.use_case).where(UseCaseDataset.use_case == UseCase.use_case)
+    session.exec(delete(UseCase).where(~has_datasets.exists()))
+    mark_use_cases_changed(session)
+
+    logger.info(f"Use-case membership rebuilt: {added} added, {removed} removed")
+    return {"added": added, "removed": removed}
+
+
+def get_use_case_datasets(session: Session, use_cases: Optional[List[str]] = None) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Aggregate usecase_datasets rows into the use_case -> node -> URLs map
+    exposed by the use-case endpoints.
+    """
+    statement = select(UseCaseDataset.use_case, UseCaseDataset.node, UseCaseDataset.dataset)
+    if use_cases is not None:
+        statement = statement.where(UseCaseDataset.use_case.in_(use_cases))
+    statement = statement.order_by(UseCaseDataset.use_case, UseCaseDataset.node, UseCaseDataset.dataset)
+
+    aggregated: Dict[str, Dict[str, List[str]]] = {}
+    for use_case, node, dataset in session.exec(statement):
+        aggregated.setdefault(use_case, {}).setdefault(node, []).append(dataset)
+    return aggregated
+
+
+def update_use_case(session, use_case: str, node: str, path: str):
+    """Register a dataset (node + path) in a use-case."""
+    try:
+        upsert_use_case_datasets(session, use_case, {node: [dataset_url(path)]})
+        mark_use_cases_changed(session, [use_case])
+        session.commit()
+        invalidate_use_cases([use_case])
+        logger.info(f"Use-case {use_case} updated with node {node}")
+
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error updating use-case: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+def _dataset_row(node_dataset: NodeDatasetInfo) -> Dict[str, Any]:
+    """Column values of a NodeDatasetInfo, ready for a Core INSERT."""
+    row = {
+        column.name: getattr(node_dataset, column.name)
+        for column in NodeDatasetInfo.__table__.columns
+    }
+    if isinstance(row.get("dataset_metadata"), BaseModel):
+        row["dataset_metadata"] = row["dataset_metadata"].model_dump()
+    # announcing a dataset (again) always makes it live
+    row["deleted_at"] = None
+    return row
+
+
+def _normalize_for_hash(value: Any) -> Any:
+    """Drop empty (None) entries recursively so equivalent payloads hash equally."""
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    if isinstance(value, dict):
+        return {key: _normalize_for_hash(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        return [_normalize_for_hash(item) for item in value]
+    return value
+
+
+def compute_content_hash(node_dataset: NodeDatasetInfo) -> str:
+    """SHA-256 of the announced content of a dataset, used to skip unchanged re-announcements."""
+    content = {
+        "use_case": node_dataset.use_case,
+        "num_records": node_dataset.num_records,
+        "num_features": node_dataset.num_features,
+        "dataset_metadata": _normalize_for_hash(getattr(node_dataset, "dataset_metadata", None)),
+    }
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _upsert_dataset_rows(session: Session, rows: List[Dict[str, Any]]):
+    """
+    Multi-row INSERT keyed on (node, path). Existing rows are only rewritten
+    when their content hash differs or they were deleted (tombstones are
+    revived), so concurrent re-announcements stay no-ops.
+    """
+    statement = _insert(session, NodeDatasetInfo).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=["node", "path"],
+        set_={
+            name: statement.excluded[name]
+            for name in ("use_case", "timestamp", "num_records", "num_features", "dataset_metadata", "content_hash", "deleted_at")
+        },
+        where=or_(
+            NodeDatasetInfo.content_hash.is_distinct_from(statement.excluded.content_hash),
+            ~LIVE_DATASET,
+        ),
+    )
+    session.exec(statement)
+
+
+def save_dataset_batch_to_database(
+    session: Session,
+    node_datasets: List[NodeDatasetInfo]
+) -> List[Dict[str, Any]]:
+    """
+    Save a batch of dataset metadata and the matching use-case updates
+    in a single transaction.
+
+    Datasets are keyed on (node, path): one indexed lookup finds the ones
+    already registered, re-announcements with an unchanged content hash are
+    skipped entirely, and the rest is written with one multi-row upsert.
+    Use-case updates are merged in memory so that every touched use-case is
+    written only once.
+
+    Returns:
+        One result dict per input item, in input order, with status
+        "created", "updated" or "unchanged".
+    """
+    if not node_datasets:
+        return []
+
+    # the last announcement of a (node, path) within the batch wins
+    latest: Dict[Tuple[str, str], NodeDatasetInfo] = {}
+    for node_dataset in node_datasets:
+        latest[(node_dataset.node, node_dataset.path)] = node_dataset
+
+    try:
+        statement = select(
+            NodeDatasetInfo.node,
+            NodeDatasetInfo.path,
+            NodeDatasetInfo.id,
+            NodeDatasetInfo.use_case,
+            NodeDatasetInfo.content_hash,
+            NodeDatasetInfo.deleted_at,
+        ).where(tuple_(NodeDatasetInfo.node, NodeDatasetInfo.path).in_(list(latest)))
+        existing = {(row[0], row[1]): row for row in session.exec(statement)}
+
+        outcome: Dict[Tuple[str, str], Tuple[str, Any]] = {}
+        rows: List[Dict[str, Any]] = []
+        # use_case -> node -> list of URLs to register
+        merged: Dict[str, Dict[str, List[str]]] = {}
+        # memberships left behind by datasets that moved to another use-case
+        moved: List[Tuple[str, str, str]] = []
+
+        for key, node_dataset in latest.items():
+            content_hash = compute_content_hash(node_dataset)
+            current = existing.get(key)
+
+            if current is not None and current.deleted_at is not None:
+                # a re-announced tombstone is revived under its old id; its memberships were dropped
+                outcome[key] = ("created", current.id)
+                current = None
+            elif current is not None and current.content_hash == content_hash:
+                outcome[key] = ("unchanged", current.id)
+                continue
+            else:
+                outcome[key] = ("updated", current.id) if current is not None else ("created", node_dataset.id)
+            row = _dataset_row(node_dataset)
+            row["content_hash"] = content_hash
+            rows.append(row)
+
+            url = dataset_url(node_dataset.path)
+            urls = merged.setdefault(node_dataset.use_case, {}).setdefault(node_dataset.node, [])
+            if url not in urls:
+                urls.append(url)
+            if current is not None and current.use_case != node_dataset.use_case:
+                moved.append((current.use_case, node_dataset.node, url))
+
+        logger.info(f"Adding batch of {len(node_datasets)} datasets: {len(rows)} to write, "
+                    f"{len(latest) - len(rows)} unchanged")
+        if rows:
+            _upsert_dataset_rows(session, rows)
+
+        for use_case, node_urls in merged.items():
+            upsert_use_case_datasets(session, use_case, node_urls)
+
+        for use_case, node, url in moved:
+            session.exec(
+                delete(UseCaseDataset).where(
+                    UseCaseDataset.use_case == use_case,
+                    UseCaseDataset.node == node,
+                    UseCaseDataset.dataset == url,
+                )
+            )
+        _prune_empty_use_cases(session, sorted({use_case for use_case, _, _ in moved}))
+
+        changed = [*merged, *(use_case for use_case, _, _ in moved)]
+        if changed:
+            mark_use_cases_changed(session, changed)
+        session.commit()
+        if changed:
+            invalidate_use_cases(changed)
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error saving dataset batch to database: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    results = []
+    for index, node_dataset in enumerate(node_datasets):
+        status, dataset_id = outcome[(node_dataset.node, node_dataset.path)]
+        results.append({
+            "index": index,
+            "id": str(dataset_id),
+            "node": node_dataset.node,
+            "path": node_dataset.path,
+            "use_case": node_dataset.use_case,
+            "status": status,
+        })
+    return results
+
+
+def validate_dataset_info(data: Dict[str, Any]) -> NodeDatasetInfo:
+    """
+    Build a NodeDatasetInfo validated like the body of POST /metadata;
+    raises ValueError, with one message per invalid field, if invalid.
+    """
+    # a table model is not validated by its constructor, so a bad field type
+    # would only surface when its whole batch fails to insert; content_hash
+    # and deleted_at are not part of an announcement and are ignored
+    try:
+        return NodeDatasetInfo.convert_to_db_entry(NodeDatasetInfoBase.model_validate(data))
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        ))
+
+
+def parse_ndjson_dataset(line: bytes) -> NodeDatasetInfo:
+    """
+    Parse one NDJSON line into a NodeDatasetInfo, validated like the body
+    of POST /metadata; raises ValueError if invalid.
+    """
+    payload = json.loads(line)
+    if not isinstance(payload, dict):
+        raise ValueError("each line must be a JSON object")
+    return validate_dataset_info(payload)
+
+
+async def ingest_ndjson_stream(
+    session: Session,
+    body: AsyncIterator[bytes],
+    chunk_rows: int = settings.INGEST_CHUNK_ROWS,
+    chunk_ms: int = settings.INGEST_CHUNK_MS,
+    max_line_bytes: int = settings.INGEST_MAX_LINE_BYTES,
+) -> AsyncIterator[bytes]:
+    """
+    Ingest a newline-delimited stream of NodeDatasetInfo records.
+
+    The body is parsed incrementally and flushed with
+    save_dataset_batch_to_database, in the thread pool, every `chunk_rows`
+    rows or `chunk_ms` milliseconds, so only one chunk is held in memory at
+    a time. Lines longer than `max_line_bytes` are skipped, not buffered.
+
+    Yields one NDJSON acknowledgement per committed chunk (and per invalid
+    line). `last_committed_line` lets the client resume after a disconnect
+    by re-sending only the lines that follow it. A disconnect or a database
+    error rolls back the chunk in progress and ends the stream with an
+    error acknowledgement.
+    """
+    buffer = b""
+    oversized = False
+    line_no = 0
+    chunk_no = 0
+    last_committed_line = 0
+    pending: List[NodeDatasetInfo] = []
+    chunk_started = time.monotonic()
+
+    async def flush() -> bytes:
+        nonlocal chunk_no, last_committed_line, pending, chunk_started
+        results = await run_in_threadpool(save_dataset_batch_to_database, session, pending)
+        chunk_no += 1
+        ack = {
+            "status": "committed",
+            "chunk": chunk_no,
+            "first_line": last_committed_line + 1,
+            "last_committed_line": line_no,
+            "created": sum(1 for r in results if r["status"] == "created"),
+            "updated": sum(1 for r in results if r["status"] == "updated"),
+            "unchanged": sum(1 for r in results if r["status"] == "unchanged"),
+        }
+        last_committed_line = line_no
+        pending = []
+        chunk_started = time.monotonic()
+        return dumps_json(ack) + b"\n"
+
+    def handle(raw: bytes, truncated: bool = False) -> Optional[bytes]:
+        nonlocal line_no
+        line_no += 1
+        if truncated or len(raw) > max_line_bytes:
+            return dumps_json({"status": "invalid", "line": line_no, "detail": f"line exceeds {max_line_bytes} bytes"}) + b"\n"
+        if not raw.strip():
+            return None
+        try:
+            pending.append(parse_ndjson_dataset(raw))
+        except ValueError as e:
+            return dumps_json({"status": "invalid", "line": line_no, "detail": str(e)}) + b"\n"
+        return None
+
+    try:
+        async for data in body:
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for raw in lines:
+                error = handle(raw, oversized)
+                oversized = False
+                if error:
+                    yield error
+
+                elapsed_ms = (time.monotonic() - chunk_started) * 1000
+                if pending and (len(pending) >= chunk_rows or elapsed_ms >= chunk_ms):
+                    yield await flush()
+
+            if len(buffer) > max_line_bytes:
+                # the rest of this line is dropped as it arrives
+                oversized, buffer = True, b""
+
+        if buffer or oversized:
+            error = handle(buffer, oversized)
+            if error:
+                yield error
+        if pending:
+            yield await flush()
+
+    except (HTTPException, SQLAlchemyError, ClientDisconnect) as e:
+        detail = getattr(e, "detail", None) or ("client disconnected" if isinstance(e, ClientDisconnect) else str(e))
+        logger.error(f"Streaming ingest aborted after line {last_committed_line}: {detail}")
+        await run_in_threadpool(session.rollback)
+        yield dumps_json({
+            "status": "error",
+            "last_committed_line": last_committed_line,
+            "detail": detail,
+        }) + b"\n"
+        return
+
+    yield dumps_json({"status": "done", "lines": line_no, "last_committed_line": last_committed_line}) + b"\n"
 
 
 #def get_dataset_info_from_database(
@@ -232,7 +760,7 @@ def update_use_case(session, use_case: str, node: str, path: str):
 
 def get_dataset_info_from_database(session: Session, path: str):
     try:
-        statement = select(NodeDatasetInfo).where(NodeDatasetInfo.path == path)
+        statement = select(NodeDatasetInfo).where(NodeDatasetInfo.path == path, LIVE_DATASET)
         dataset_info = session.exec(statement).first()
         if dataset_info is None:
             raise HTTPException(
@@ -243,6 +771,29 @@ def get_dataset_info_from_database(session: Session, path: str):
     except Exception:
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+def get_datasets_by_paths(session: Session, paths: List[str]) -> Dict[str, Any]:
+    """
+    Resolve many paths in a single indexed query. On PostgreSQL the paths
+    are bound as one array (path = ANY(:paths)), so the statement text does
+    not change with the number of paths.
+    """
+    paths = list(dict.fromkeys(paths))
+    if session.get_bind().dialect.name == "postgresql":
+        condition = NodeDatasetInfo.path == any_(cast(literal(paths, ARRAY(String)), ARRAY(String)))
+    else:
+        condition = NodeDatasetInfo.path.in_(paths)
+
+    try:
+        rows = session.exec(select(NodeDatasetInfo).where(condition, LIVE_DATASET)).all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    found = {row.path for row in rows}
+    return {
+        "datasets": [row.model_dump() for row in rows],
+        "missing": [path for path in paths if path not in found],
+    }
+
 #def remove_dataset_info_from_database(session: Session, node: str, disease: str, path: str) -> bool:
 #    try:
 #        # Fetch the dataset info
@@ -270,27 +821,36 @@ def get_dataset_info_from_database(session: Session, path: str):
 def remove_dataset_info_from_database(session: Session, path: str) -> bool:
     try:
         # Fetch dataset
-        statement = select(NodeDatasetInfo).where(NodeDatasetInfo.path == path)
-        dataset_info = session.exec(statement).first()
-        path_url = f"obstorageapi.k8s.synthema.rid-intrasoft.eu/{path}"
+        statement = select(NodeDatasetInfo.id, NodeDatasetInfo.use_case, NodeDatasetInfo.node).where(
+            NodeDatasetInfo.path == path, LIVE_DATASET
+        )
+        dataset_info = session.execute(statement).first()
         if not dataset_info:
             return False
 
         use_case = dataset_info.use_case
         node = dataset_info.node
 
-        # delete dataset entry
-        session.delete(dataset_info)
-
-       # update use-case table
-        uc = session.get(UseCase, use_case)
-        if uc:
-            uc.datasets = [d for d in uc.datasets if d != path_url]
+        # tombstone the dataset entry; compaction purges it later
+        session.exec(
+            update(NodeDatasetInfo)
+            .where(NodeDatasetInfo.id == dataset_info.id, LIVE_DATASET)
+            .values(deleted_at=database_utc_now(session))
+        )
 
-            if len(uc.datasets) == 0:
-                session.delete(uc)
+        # update use-case membership
+        session.exec(
+            delete(UseCaseDataset).where(
+                UseCaseDataset.use_case == use_case,
+                UseCaseDataset.node == node,
+                UseCaseDataset.dataset == dataset_url(path),
+            )
+        )
+        _prune_empty_use_cases(session, [use_case])
+        mark_use_cases_changed(session, [use_case])
 
         session.commit()
+        invalidate_use_cases([use_case])
         return True
 
     except Exception:
@@ -298,62 +858,258 @@ def remove_dataset_info_from_database(session: Session, path: str) -> bool:
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-def remove_all_datasets_from_database(session: Session):
+# membership rows pruned per statement outside PostgreSQL
+MEMBERSHIP_PRUNE_CHUNK_ROWS = 500
+
+
+def dataset_selector_conditions(node: Optional[str] = None, use_case: Optional[str] = None) -> List[Any]:
+    """WHERE conditions of the node/use_case selectors of the scoped deletes, over live datasets."""
+    conditions = [LIVE_DATASET]
+    if node is not None:
+        conditions.append(NodeDatasetInfo.node == node)
+    if use_case is not None:
+        conditions.append(NodeDatasetInfo.use_case == use_case)
+    if len(conditions) == 1:
+        raise ValueError("A node or use_case selector is required")
+    return conditions
+
+
+def delete_datasets(
+    session: Session,
+    node: Optional[str] = None,
+    use_case: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Tombstone the datasets of a node and/or use-case (at most limit of
+    them) and drop the matching use-case memberships, without committing.
+
+    On PostgreSQL this is a single statement: the UPDATE ... RETURNING on
+    nodedatasetinfo (served by the (node, path) and use_case indexes)
+    feeds the membership DELETE through a CTE, so no row travels to the
+    application. Elsewhere the tombstoned rows are returned and their
+    memberships deleted in chunks.
+
+    Returns:
+        The deleted dataset and membership counts, and the use-cases touched.
+    """
+    conditions = dataset_selector_conditions(node, use_case)
+    if limit is not None:
+        conditions = [LIVE_DATASET, NodeDatasetInfo.id.in_(select(NodeDatasetInfo.id).where(*conditions).limit(limit))]
+
+    deleted = (
+        update(NodeDatasetInfo)
+        .where(*conditions)
+        .values(deleted_at=database_utc_now(session))
+        .returning(NodeDatasetInfo.use_case, NodeDatasetInfo.node, NodeDatasetInfo.path)
+    )
+
+    if session.get_bind().dialect.name == "postgresql":
+        deleted = deleted.cte("deleted")
+        pruned = (
+            delete(UseCaseDataset)
+            .where(
+                UseCaseDataset.use_case == deleted.c.use_case,
+                UseCaseDataset.node == deleted.c.node,
+                UseCaseDataset.dataset == literal(f"{MINIO_ENDPOINT}/") + deleted.c.path,
+            )
+            .returning(UseCaseDataset.use_case)
+            .cte("pruned")
+        )
+        datasets, memberships, use_cases = session.execute(select(
+            select(func.count()).select_from(deleted).scalar_subquery(),
+            select(func.count()).select_from(pruned).scalar_subquery(),
+            func.array(select(deleted.c.use_case).distinct().scalar_subquery()),
+        )).one()
+    else:
+        rows = session.execute(deleted).all()
+        datasets, memberships = len(rows), 0
+        use_cases = sorted({row.use_case for row in rows})
+        for start in range(0, len(rows), MEMBERSHIP_PRUNE_CHUNK_ROWS):
+            keys = [
+                (row.use_case, row.node, dataset_url(row.path))
+                for row in rows[start:start + MEMBERSHIP_PRUNE_CHUNK_ROWS]
+            ]
+            memberships += session.exec(
+                delete(UseCaseDataset).where(
+                    tuple_(UseCaseDataset.use_case, UseCaseDataset.node, UseCaseDataset.dataset).in_(keys)
+                )
+            ).rowcount
+
+    _prune_empty_use_cases(session, use_cases)
+    if use_cases:
+        mark_use_cases_changed(session, use_cases)
+    return {"datasets": datasets, "memberships": memberships}, list(use_cases)
+
+
+def remove_datasets_from_database(
+    session: Session,
+    node: Optional[str] = None,
+    use_case: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Delete every dataset of a node and/or use-case, and drop the matching
+    use-case memberships, in one transaction (see delete_datasets).
+    """
+    dataset_selector_conditions(node, use_case)
+
+    try:
+        deleted, use_cases = delete_datasets(session, node, use_case)
+        session.commit()
+        invalidate_use_cases(use_cases)
+        return deleted
+
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error removing datasets from database: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+def delete_all_rows(session: Session, tables: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Empty the given tables ({result key: model}) inside the caller's
+    transaction and return how many rows each one held.
+
+    On PostgreSQL the tables are locked, counted and TRUNCATEd with
+    RESTART IDENTITY in one statement: no per-row work, no dead tuples
+    left for vacuum. None of them is referenced by a foreign key, and the
+    TRUNCATE trigger on nodedatasetinfo keeps the catalogue statistics in
+    step. Other databases fall back to one DELETE per table. Datasets are
+    tombstoned instead (see tombstone_all_datasets).
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        names = ", ".join(model.__tablename__ for model in tables.values())
+        # queued readers wait behind the lock request, so fail rather than stall them
+        lock_timeout_ms = int(settings.BULK_DELETE_LOCK_TIMEOUT_SECONDS * 1000)
+        session.exec(text(f"SET LOCAL lock_timeout = {lock_timeout_ms}"))
+        # no row can be added between the counts and the TRUNCATE
+        session.exec(text(f"LOCK TABLE {names} IN ACCESS EXCLUSIVE MODE"))
+        counts = {key: session.exec(select(func.count()).select_from(model)).one() for key, model in tables.items()}
+        session.exec(text(f"TRUNCATE {names} RESTART IDENTITY"))
+        return counts
+
+    return {key: session.exec(delete(model)).rowcount for key, model in tables.items()}
+
+
+def tombstone_all_datasets(session: Session) -> int:
+    """
+    Mark every live dataset deleted with one UPDATE, without committing.
+    Unlike a TRUNCATE this takes no table lock readers would queue behind,
+    and incremental consumers see the removals in GET /metadata/deleted.
+    """
+    return session.exec(
+        update(NodeDatasetInfo).where(LIVE_DATASET).values(deleted_at=database_utc_now(session))
+    ).rowcount
+
+
+def remove_all_datasets_from_database(session: Session) -> Dict[str, int]:
+    """Delete all dataset metadata in one statement; returns the number of rows deleted."""
     try:
-        statement = select(NodeDatasetInfo)
-        datasets = session.exec(statement).all()
-        for dataset in datasets:
-            session.delete(dataset)
+        deleted = {"datasets": tombstone_all_datasets(session)}
         session.commit()
+        return deleted
     except Exception as e:
+        session.rollback()
         print("Error removing all datasets from database:", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-def get_all_use_cases(session: Session):
-    """Return all use-case records."""
-    statement = select(UseCase)
-    return session.exec(statement).all()
+def get_all_use_cases(session: Session) -> List[Dict[str, Any]]:
+    """Return all use-cases with their node -> URLs datasets map (cached)."""
+    return get_all_use_cases_versioned(session)[1]
 
 
-def get_single_use_case(session: Session, use_case: str):
-    """Return a single use case or raise 404."""
-    statement = select(UseCase).where(UseCase.use_case == use_case)
-    result = session.exec(statement).first()
+def get_all_use_cases_versioned(session: Session) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Return the listing version and all use-cases (cached). The version is
+    read first, so the listing is never older than the version.
+    """
+    def load():
+        version = session.exec(select(func.coalesce(func.sum(UseCaseVersion.version), 0))).one()
+        use_cases = session.exec(select(UseCase.use_case).order_by(UseCase.use_case)).all()
+        datasets = get_use_case_datasets(session)
+
+        return version, [
+            {"use_case": use_case, "datasets": datasets.get(use_case, {})}
+            for use_case in use_cases
+        ]
 
-    if not result:
-        raise HTTPException(status_code=404, detail="Use case not found")
+    return use_case_cache.get_or_load(USE_CASE_LISTING_KEY, load)
 
-    return result
 
+def get_use_cases_page(session: Session, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Return one page of use-cases (keyset pagination on use_case) with their
+    datasets map, plus the cursor of the next page (None on the last page).
+    """
+    statement = select(UseCase.use_case).order_by(UseCase.use_case)
+    if cursor:
+        (after,) = decode_cursor(cursor, 1)
+        statement = statement.where(UseCase.use_case > after)
 
-def delete_all_use_cases(session: Session):
-    """Delete all use-case records."""
-    session.exec(
-        UseCase.__table__.delete()   # SQLModel-correct bulk delete
-    )
+    use_cases = list(session.exec(statement.limit(limit + 1)).all())
+    next_cursor = None
+    if len(use_cases) > limit:
+        use_cases = use_cases[:limit]
+        next_cursor = encode_cursor([use_cases[-1]])
+
+    datasets = get_use_case_datasets(session, use_cases)
+    page = [
+        {"use_case": use_case, "datasets": datasets.get(use_case, {})}
+        for use_case in use_cases
+    ]
+    return page, next_cursor
+
+
+def get_single_use_case(session: Session, use_case: str) -> Dict[str, Any]:
+    """Return a single use case with its datasets map (cached) or raise 404."""
+    return get_single_use_case_versioned(session, use_case)[1]
+
+
+def get_single_use_case_versioned(session: Session, use_case: str) -> Tuple[int, Dict[str, Any]]:
+    """
+    Return the version and the datasets map of a use case (cached) or
+    raise 404. The version is read first, so the map is never older.
+    """
+    def load():
+        version = session.exec(
+            select(UseCaseVersion.version).where(UseCaseVersion.use_case == use_case)
+        ).first() or 0
+        statement = select(UseCase.use_case).where(UseCase.use_case == use_case)
+        result = session.exec(statement).first()
+
+        if not result:
+            raise HTTPException(status_code=404, detail="Use case not found")
+
+        datasets = get_use_case_datasets(session, [use_case])
+        return version, {"use_case": result, "datasets": datasets.get(use_case, {})}
+
+    return use_case_cache.get_or_load(use_case_key(use_case), load)
+
+
+def delete_all_use_cases(session: Session) -> Dict[str, int]:
+    """Delete all use-case records; returns the number of rows deleted."""
+    # versions are bumped, not deleted, so ETags are never reused
+    mark_use_cases_changed(session)
+    deleted = delete_all_rows(session, {"use_cases": UseCase, "memberships": UseCaseDataset})
     session.commit()
-    return True
+    use_case_cache.clear()
+    return deleted
 
-def delete_all_use_cases_and_datasets(session: Session):
+def delete_all_use_cases_and_datasets(session: Session) -> Dict[str, int]:
     """
     Deletes all use-cases AND all dataset metadata in a single transaction.
     """
 
     try:
-        statement = select(NodeDatasetInfo)
-        datasets = session.exec(statement).all()
-        for dataset in datasets:
-            session.delete(dataset)
-        session.commit()
-
-        # Delete use cases
-        """Delete all use-case records."""
-        session.exec(
-        UseCase.__table__.delete()   # SQLModel-correct bulk delete
-        )
+        mark_use_cases_changed(session)
+        deleted = {
+            "datasets": tombstone_all_datasets(session),
+            **delete_all_rows(session, {"use_cases": UseCase, "memberships": UseCaseDataset}),
+        }
         session.commit()
-        return True
+        use_case_cache.clear()
+        return deleted
 
     except Exception as e:
         session.rollback()
@@ -361,12 +1117,12 @@ def delete_all_use_cases_and_datasets(session: Session):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-def delete_all_datasets_and_usecases(session: Session):
+def delete_all_datasets_and_usecases(session: Session) -> Dict[str, int]:
     """
     Same as above, but callable from datasets endpoint.
     Keeps logic consistent.
     """
-    delete_all_use_cases_and_datasets(session)
+    return delete_all_use_cases_and_datasets(session)
 
 
 def remove_single_dataset_from_use_case(session: Session, dataset_path: str) -> bool:
@@ -381,51 +1137,459 @@ def remove_single_dataset_from_use_case(session: Session, dataset_path: str) ->
         }
     """
     try:
-        # Fetch ALL use-cases
-        statement = select(UseCase)
-        use_cases = session.exec(statement).all()
+        # Use-cases listing the dataset (indexed lookup on usecase_datasets.dataset)
+        statement = select(UseCaseDataset.use_case).where(UseCaseDataset.dataset == dataset_path).distinct()
+        use_cases = list(session.exec(statement).all())
 
-        changed = False
+        if not use_cases:
+            return False
 
-        for uc in use_cases:
-            new_datasets = {}
+        session.exec(delete(UseCaseDataset).where(UseCaseDataset.dataset == dataset_path))
 
-            for node, paths in uc.datasets.items():
-                # Filter the list
-                filtered = [p for p in paths if p != dataset_path]
+        # If after removal a use-case is empty → delete use-case
+        _prune_empty_use_cases(session, use_cases)
+        mark_use_cases_changed(session, use_cases)
 
-                if filtered:
-                    new_datasets[node] = filtered
-                # If empty list → remove node completely
+        session.commit()
+        invalidate_use_cases(use_cases)
+        return True
 
-            # If the dataset was removed
-            if new_datasets != uc.datasets:
-                changed = True
-                uc.datasets = new_datasets
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
 
-            # If after removal the use-case is empty → delete use-case
-            if not uc.datasets:
-                session.delete(uc)
 
-        if changed:
-            session.commit()
+# Dataset columns a `fields=` projection may select: those of the API model,
+# without bookkeeping columns such as content_hash and deleted_at
+PUBLIC_DATASET_FIELDS = tuple(NodeDatasetInfoBase.model_fields)
 
-        return changed
 
+def parse_dataset_fields(fields: Optional[str]) -> Optional[List[Tuple[str, ...]]]:
+    """
+    Parse a `fields=` projection ("node,path,dataset_metadata.title") into
+    column / dataset_metadata sub-path tuples. None selects whole rows.
+    """
+    if not fields:
+        return None
+
+    projection: List[Tuple[str, ...]] = []
+    for field in fields.split(","):
+        field = field.strip()
+        if not field:
+            continue
+        path = tuple(field.split("."))
+        if path[0] not in PUBLIC_DATASET_FIELDS or "" in path or (len(path) > 1 and path[0] != "dataset_metadata"):
+            raise HTTPException(status_code=400, detail=f"Unknown field: {field}")
+        if path not in projection:
+            projection.append(path)
+
+    # a whole dataset_metadata document already contains its sub-paths
+    if ("dataset_metadata",) in projection:
+        projection = [path for path in projection if path[0] != "dataset_metadata" or len(path) == 1]
+    return projection or None
+
+
+def _projected_columns(projection: List[Tuple[str, ...]]) -> List[Any]:
+    """Column expressions selecting only the projected fields."""
+    columns = []
+    for path in projection:
+        if len(path) == 1:
+            columns.append(getattr(NodeDatasetInfo, path[0]))
+        else:
+            key = path[1] if len(path) == 2 else path[1:]
+            columns.append(NodeDatasetInfo.dataset_metadata[key].label(".".join(path)))
+    return columns
+
+
+def _projected_row(projection: List[Tuple[str, ...]], values) -> Dict[str, Any]:
+    """Nest projected values back into the shape of a dataset document."""
+    row: Dict[str, Any] = {}
+    for path, value in zip(projection, values):
+        target = row
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+    return row
+
+
+async def fetch_all_datasets(session: Session, projection: Optional[List[Tuple[str, ...]]] = None):
+    try:
+        if projection:
+            rows = session.execute(select(*_projected_columns(projection)).where(LIVE_DATASET)).all()
+            return [_projected_row(projection, row) for row in rows]
+        statement = select(NodeDatasetInfo).where(LIVE_DATASET)
+        rows = session.exec(statement).all()
+        datasets = [row.model_dump() for row in rows]
+        return datasets
     except Exception as e:
-        session.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def fetch_all_datasets(session: Session):
+def iter_datasets_ndjson(session: Session, batch_size: int = settings.STREAM_BATCH_ROWS, projection: Optional[List[Tuple[str, ...]]] = None) -> Iterator[bytes]:
+    """
+    Yield every dataset as one NDJSON line, reading them through a
+    server-side cursor so that memory does not grow with the catalogue.
+    """
+    if projection:
+        statement = select(*_projected_columns(projection)).where(LIVE_DATASET).execution_options(yield_per=batch_size)
+        for row in session.execute(statement):
+            yield dumps_json(_projected_row(projection, row)) + b"\n"
+        return
+
+    statement = select(NodeDatasetInfo).where(LIVE_DATASET).execution_options(yield_per=batch_size)
+    for row in session.exec(statement):
+        yield dumps_json(row.model_dump()) + b"\n"
+
+
+def iter_use_cases_ndjson(session: Session, batch_size: int = settings.STREAM_BATCH_ROWS) -> Iterator[bytes]:
+    """
+    Yield every use-case with its node -> URLs datasets map as one NDJSON
+    line. Membership rows are read in use_case order through a server-side
+    cursor and grouped as they arrive.
+    """
+    statement = (
+        select(UseCase.use_case, UseCaseDataset.node, UseCaseDataset.dataset)
+        .outerjoin(UseCaseDataset, UseCaseDataset.use_case == UseCase.use_case)
+        .order_by(UseCase.use_case, UseCaseDataset.node, UseCaseDataset.dataset)
+        .execution_options(yield_per=batch_size)
+    )
+
+    current, datasets = None, {}
+    for use_case, node, dataset in session.exec(statement):
+        if use_case != current:
+            if current is not None:
+                yield dumps_json({"use_case": current, "datasets": datasets}) + b"\n"
+            current, datasets = use_case, {}
+        if node is not None:
+            datasets.setdefault(node, []).append(dataset)
+    if current is not None:
+        yield dumps_json({"use_case": current, "datasets": datasets}) + b"\n"
+
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD_BYTES = 7900
+
+# search filter -> path of the value in dataset_metadata
+METADATA_SEARCH_FIELDS = {
+    "theme": ("theme",),
+    "keyword": ("keyword",),
+    "language": ("language",),
+    "spatial": ("spatial",),
+    "accessRights": ("accessRights",),
+    "license": ("license",),
+    "publisher": ("publisher", "name"),
+}
+
+
+def dataset_search_conditions(session: Session, filters: Dict[str, Optional[str]]) -> List[Any]:
+    """
+    Translate search filters into WHERE conditions on NodeDatasetInfo.
+
+    On PostgreSQL all dataset_metadata filters are combined into a single
+    JSONB containment (@>) test, served by the GIN jsonb_path_ops index;
+    filters on INDEXED_METADATA_FIELDS are repeated as equalities, so the
+    planner can use their btree expression indexes instead.
+    """
+    conditions = []
+    if filters.get("use_case") is not None:
+        conditions.append(NodeDatasetInfo.use_case == filters["use_case"])
+    if filters.get("node") is not None:
+        conditions.append(NodeDatasetInfo.node == filters["node"])
+
+    metadata_filters = {
+        path: filters[name]
+        for name, path in METADATA_SEARCH_FIELDS.items()
+        if filters.get(name) is not None
+    }
+    if not metadata_filters:
+        return conditions
+
+    if session.get_bind().dialect.name == "postgresql":
+        document: Dict[str, Any] = {}
+        for path, value in metadata_filters.items():
+            target = document
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+        metadata = type_coerce(NodeDatasetInfo.dataset_metadata, JSONB)
+        conditions.append(metadata.contains(document))
+        for field in INDEXED_METADATA_FIELDS:
+            if (field,) in metadata_filters:
+                conditions.append(metadata[field].astext == metadata_filters[(field,)])
+    else:
+        for path, value in metadata_filters.items():
+            conditions.append(NodeDatasetInfo.dataset_metadata[path].as_string() == value)
+    return conditions
+
+
+# ts_headline options of full-text search snippets
+FULLTEXT_HEADLINE_OPTIONS = "MaxFragments=2, MinWords=8, MaxWords=25, StartSel=<b>, StopSel=</b>"
+
+
+def search_datasets_fulltext(session: Session, query: str, limit: int, offset: int = 0) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Rank datasets against a web-search style query using the generated
+    search_vector column, returning one page of
+    {"dataset", "rank", "snippet"} and the offset of the next page.
+    Snippets are only computed for the rows of the page.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        raise HTTPException(status_code=501, detail="Full-text search requires PostgreSQL")
+
+    config = cast(literal(settings.FULLTEXT_SEARCH_CONFIG), REGCONFIG)
+    tsquery = func.websearch_to_tsquery(config, query)
+    search_vector = literal_column(f"{NodeDatasetInfo.__tablename__}.search_vector", TSVECTOR)
+    rank = func.ts_rank(search_vector, tsquery)
+
+    ranked = (
+        select(NodeDatasetInfo.id, rank.label("rank"))
+        .where(search_vector.op("@@")(tsquery), LIVE_DATASET)
+        .order_by(rank.desc(), NodeDatasetInfo.id)
+        .limit(limit + 1)
+        .offset(offset)
+        .subquery()
+    )
+    metadata = type_coerce(NodeDatasetInfo.dataset_metadata, JSONB)
+    document = func.concat_ws(" ... ", metadata["title"].astext, metadata["description"].astext)
+    statement = (
+        select(NodeDatasetInfo, ranked.c.rank, func.ts_headline(config, document, tsquery, FULLTEXT_HEADLINE_OPTIONS))
+        .join(ranked, ranked.c.id == NodeDatasetInfo.id)
+        .order_by(ranked.c.rank.desc(), NodeDatasetInfo.id)
+    )
+
     try:
-        statement = select(NodeDatasetInfo)
         rows = session.exec(statement).all()
-        datasets = [row.dict() for row in rows]
-        return datasets
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    next_offset = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_offset = offset + limit
+
+    results = [
+        {"dataset": dataset.model_dump(), "rank": rank_value, "snippet": snippet}
+        for dataset, rank_value, snippet in rows
+    ]
+    return results, next_offset
+
+
+# dataset_metadata facets; node and use_case are columns
+METADATA_FACETS = [facet for facet in CATALOGUE_FACETS if facet not in ("node", "use_case")]
+
+
+def _facet_expressions() -> Dict[str, Any]:
+    """Facet name -> SQL expression on NodeDatasetInfo."""
+    expressions = {"node": NodeDatasetInfo.node, "use_case": NodeDatasetInfo.use_case}
+    for facet in METADATA_FACETS:
+        expressions[facet] = NodeDatasetInfo.dataset_metadata[facet].as_string()
+    return expressions
+
+
+def get_dataset_facets(session: Session, filters: Dict[str, Optional[str]], facet_limit: int) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Count the datasets matching the search filters per value of every facet,
+    most frequent values first. Without filters on PostgreSQL the counts are
+    read from the trigger-maintained catalogue_facets table; otherwise all
+    facets are counted in a single GROUP BY GROUPING SETS over the rows
+    selected (through the search indexes) by the filters.
+    """
+    conditions = dataset_search_conditions(session, filters)
+    postgresql = session.get_bind().dialect.name == "postgresql"
+    facets: Dict[str, List[Dict[str, Any]]] = {facet: [] for facet in CATALOGUE_FACETS}
+
+    if postgresql and not conditions:
+        statement = select(CatalogueFacet.facet, CatalogueFacet.value, CatalogueFacet.datasets)
+    else:
+        expressions = _facet_expressions()
+        names = list(expressions)
+        if postgresql:
+            # GROUPING() sets a bit for every column a row is not grouped by,
+            # the first column being the highest bit
+            all_bits = (1 << len(names)) - 1
+            masks = {name: all_bits ^ (1 << (len(names) - 1 - index)) for index, name in enumerate(names)}
+            grouping = func.grouping(*expressions.values())
+            facet_name = case(*[(grouping == mask, name) for name, mask in masks.items()])
+            value = func.coalesce(*expressions.values())
+            statement = (
+                select(facet_name, value, func.count())
+                .where(LIVE_DATASET, *conditions)
+                .group_by(func.grouping_sets(*[tuple_(expression) for expression in expressions.values()]))
+            )
+        else:
+            statement = union_all(*[
+                select(literal(name), expression, func.count()).where(LIVE_DATASET, *conditions).group_by(expression)
+                for name, expression in expressions.items()
+            ])
+
+    try:
+        rows = session.execute(statement).all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for facet, value, count in rows:
+        if value is not None:
+            facets[facet].append({"value": value, "count": count})
+    for facet, values in facets.items():
+        values.sort(key=lambda item: (-item["count"], item["value"]))
+        del values[facet_limit:]
+    return facets
+
+
+STATS_COUNTERS = [
+    "datasets",
+    "num_records_sum",
+    "num_records_count",
+    "num_features_sum",
+    "num_features_sq_sum",
+    "num_features_count",
+]
+
+
+def _stats_block(counters: Dict[str, int]) -> Dict[str, Any]:
+    """Public shape of a group of catalogue_stats counters."""
+    count = counters["num_features_count"]
+    mean = counters["num_features_sum"] / count if count else None
+    stddev = math.sqrt(max(counters["num_features_sq_sum"] / count - mean * mean, 0)) if count else None
+    return {
+        "datasets": counters["datasets"],
+        "num_records": {"total": counters["num_records_sum"], "reported": counters["num_records_count"]},
+        "num_features": {"reported": count, "mean": mean, "stddev": stddev},
+    }
+
+
+def get_catalogue_stats(session: Session) -> Dict[str, Any]:
+    """
+    Per use-case, per node and overall rollups of the datasets, computed
+    from the catalogue_stats groups rather than from the datasets.
+    """
+    rows = session.exec(select(CatalogueStats).order_by(CatalogueStats.use_case, CatalogueStats.node)).all()
+
+    def empty():
+        return dict.fromkeys(STATS_COUNTERS, 0)
+
+    total = empty()
+    use_cases: Dict[str, Dict[str, int]] = {}
+    nodes: Dict[str, Dict[str, int]] = {}
+    use_case_nodes: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        for counters in (total, use_cases.setdefault(row.use_case, empty()), nodes.setdefault(row.node, empty())):
+            for name in STATS_COUNTERS:
+                counters[name] += getattr(row, name)
+        use_case_nodes.setdefault(row.use_case, []).append(
+            {"node": row.node, **_stats_block({name: getattr(row, name) for name in STATS_COUNTERS})}
+        )
+
+    return {
+        "total": _stats_block(total),
+        "use_cases": [
+            {"use_case": use_case, **_stats_block(counters), "nodes": use_case_nodes[use_case]}
+            for use_case, counters in use_cases.items()
+        ],
+        "nodes": [{"node": node, **_stats_block(counters)} for node, counters in sorted(nodes.items())],
+    }
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque pagination token for the last key of a page."""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode a token produced by encode_cursor, raising 400 if it is not valid."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def fetch_datasets_page(session: Session, limit: int, cursor: Optional[str] = None, conditions: Optional[List[Any]] = None, projection: Optional[List[Tuple[str, ...]]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Return one page of datasets using keyset pagination on id, plus the
+    cursor of the next page (None on the last page). The key never changes
+    once a dataset is catalogued, so re-announcing a dataset while a client
+    pages through the listing neither skips nor repeats it.
+    `conditions` optionally restricts the datasets listed and `projection`
+    (see parse_dataset_fields) the fields returned.
+    """
+    if projection:
+        # the page key is selected last, after the projected fields
+        statement = select(*_projected_columns(projection), NodeDatasetInfo.id)
+    else:
+        statement = select(NodeDatasetInfo)
+    statement = statement.where(LIVE_DATASET).order_by(NodeDatasetInfo.id)
+    if conditions:
+        statement = statement.where(*conditions)
+    if cursor:
+        (dataset_id,) = decode_cursor(cursor, 1)
+        try:
+            key = uuid_pkg.UUID(dataset_id)
+        except (AttributeError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        statement = statement.where(NodeDatasetInfo.id > key)
+
+    try:
+        # one extra row tells whether another page follows
+        rows = session.exec(statement.limit(limit + 1)).all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([str(last[-1] if projection else last.id)])
+
+    if projection:
+        return [_projected_row(projection, row[:-1]) for row in rows], next_cursor
+    return [row.model_dump() for row in rows], next_cursor
+
+
+def fetch_tombstones_page(session: Session, limit: int, cursor: Optional[str] = None, since: Optional[datetime] = None, lag_seconds: float = settings.TOMBSTONE_FEED_LAG_SECONDS) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Return one page of deleted datasets in deletion order (keyset on
+    (deleted_at, id), served by the partial tombstone index), plus the
+    cursor of the next page. Tombstones are kept for
+    settings.TOMBSTONE_RETENTION_SECONDS, so consumers syncing less often
+    than that must resynchronize from the full listing.
+
+    Tombstones younger than `lag_seconds` on the database clock are held
+    back: deleted_at is taken when the deleting statement runs, so a
+    transaction committing later could otherwise land behind a cursor
+    already handed out.
+    """
+    statement = (
+        select(NodeDatasetInfo.id, NodeDatasetInfo.node, NodeDatasetInfo.path, NodeDatasetInfo.use_case, NodeDatasetInfo.deleted_at)
+        .where(~LIVE_DATASET, NodeDatasetInfo.deleted_at <= database_utc_now(session, lag_seconds))
+        .order_by(NodeDatasetInfo.deleted_at, NodeDatasetInfo.id)
+    )
+    if since is not None:
+        if since.tzinfo is not None:
+            # deleted_at is naive UTC
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        statement = statement.where(NodeDatasetInfo.deleted_at > since)
+    if cursor:
+        deleted_at, dataset_id = decode_cursor(cursor, 2)
+        try:
+            key = (datetime.fromisoformat(deleted_at), uuid_pkg.UUID(dataset_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        statement = statement.where(tuple_(NodeDatasetInfo.deleted_at, NodeDatasetInfo.id) > key)
+
+    try:
+        rows = session.execute(statement.limit(limit + 1)).all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].deleted_at.isoformat(), str(rows[-1].id)])
+    return [dict(row._mapping) for row in rows], next_cursor
+
 async def register_new_sdg_task(
         task: SyntheticDatasetGenerationRequestStatus,
         session: Session,